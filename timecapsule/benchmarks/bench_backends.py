@@ -0,0 +1,25 @@
+#!/usr/bin/env python
+'''times deposit() and toDF() with each json backend on typical capsule sizes\n
+run from the project root:  python -m benchmarks.bench_backends'''
+import timeit, tempfile
+from pathlib import Path
+
+import timecapsule as tc
+from benchmarks.bench_deposit import synthDF
+
+# (timesteps, columns): a year of hourly sim vs obs, a decade of it, a many-trace capsule
+sizes = [(8_760,2),(87_600,2),(100_000,12)]
+
+if __name__ == '__main__':
+    backends = ['json'] + (['orjson'] if tc.timecapsule.orjson else [])
+    print(f"{'size':>14} {'backend':>8} {'deposit s':>10} {'toDF s':>8} {'MB':>6}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for timesteps,columns in sizes:
+            df = synthDF(timesteps,columns)
+            for backend in backends:
+                tc.setJSONbackend(backend)
+                out = Path(tmp)/f'{backend}.json'
+                tdep = min(timeit.repeat(lambda: tc.deposit(out,df),number=1,repeat=3))
+                tread = min(timeit.repeat(lambda: tc.toDF(out),number=1,repeat=3))
+                print(f'{timesteps:>8}x{columns:<5} {backend:>8} {tdep:10.3f} {tread:8.3f} {out.stat().st_size/1e6:6.1f}')
+    tc.setJSONbackend('json')
@@ -0,0 +1,39 @@
+#!/usr/bin/env python
+'''times deposit() against the old nan2None + json.dump(cls=NanConverter) path\n
+run from the project root:  python -m benchmarks.bench_deposit [timesteps] [columns]'''
+import sys, json, timeit, tempfile
+from pathlib import Path
+import pandas as pd, numpy as np
+
+import timecapsule as tc
+from timecapsule import nan2None, NanConverter
+
+def legacyDeposit(outJSON,df):
+    '''the pre-vectorization deposit() serialization, for comparison'''
+    X = nan2None(df.index.strftime('%Y-%m-%d %X').to_list())
+    jsn = {'x':X,
+        'data':[{'name':col,'y':nan2None(df[col].to_list())} for col in df.columns],
+        'layout':{'xaxis':{'title':{'text':df.index.name}}} if df.index.name else {}}
+    with open(outJSON, 'w') as outfile:
+        json.dump(jsn,outfile,cls=NanConverter)
+    return jsn
+
+def synthDF(timesteps=200_000,columns=12,nanfrac=0.05,seed=0):
+    rng = np.random.default_rng(seed)
+    idx = pd.date_range('2000-01-01',periods=timesteps,freq='h',name='Time (UTC)')
+    vals = rng.normal(size=(timesteps,columns)).cumsum(axis=0)
+    vals[rng.random(vals.shape)<nanfrac] = np.nan
+    return pd.DataFrame(vals,index=idx,columns=[f'gauge{i}' for i in range(columns)])
+
+if __name__ == '__main__':
+    timesteps = int(sys.argv[1]) if len(sys.argv)>1 else 200_000
+    columns = int(sys.argv[2]) if len(sys.argv)>2 else 12
+    df = synthDF(timesteps,columns)
+    with tempfile.TemporaryDirectory() as tmp:
+        old,new = Path(tmp)/'old.json', Path(tmp)/'new.json'
+        told = min(timeit.repeat(lambda: legacyDeposit(old,df),number=1,repeat=3))
+        tnew = min(timeit.repeat(lambda: tc.deposit(new,df),number=1,repeat=3))
+        assert old.read_bytes() == new.read_bytes(), 'output not byte-compatible'
+    print(f'{timesteps} timesteps x {columns} columns')
+    print(f'legacy  {told:8.3f} s')
+    print(f'deposit {tnew:8.3f} s  ({told/tnew:.1f}x)')
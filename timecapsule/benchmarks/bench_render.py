@@ -0,0 +1,26 @@
+#!/usr/bin/env python
+'''times rendering a capsule to a html div with plot() (plotly Figure) vs plotSpec() (plain dict)\n
+run from the project root:  python -m benchmarks.bench_render'''
+import timeit, tempfile
+from pathlib import Path
+
+import timecapsule as tc
+from timecapsule.timecapsule import _figDiv
+from benchmarks.bench_deposit import synthDF
+
+# (timesteps, columns): a week of hourly sim vs obs, a year of it, a decade of it
+sizes = [(168,2),(8_760,2),(87_600,2)]
+attrz = {'Name':'gauge','corr':0.81,'MAE':0.46,'RMSE':0.56,'NSE':0.54}
+bounds = {'NSE':{'lbound':0.5},'MAE':{'rbound':0.5}}
+
+if __name__ == '__main__':
+    print(f"{'size':>14} {'plot ms':>8} {'plotSpec ms':>11} {'speedup':>8}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for timesteps,columns in sizes:
+            out = Path(tmp)/'ts_gauge.json'
+            tc.deposit(out,synthDF(timesteps,columns),attrz=attrz,data={'line':{'width':1}})
+            times = [
+                min(timeit.repeat(lambda: _figDiv(out,plotkw={'title':'gauge','bounds':bounds},fast=fast),
+                    number=3,repeat=3))/3*1e3
+                for fast in (False,True) ]
+            print(f'{timesteps:>8}x{columns:<5} {times[0]:8.1f} {times[1]:11.1f} {times[0]/times[1]:7.1f}x')
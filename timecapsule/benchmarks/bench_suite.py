@@ -0,0 +1,118 @@
+#!/usr/bin/env python
+'''times deposit, depositDSsuite, toDF, plot and toHTML on synthetic xarray suites, with their peak
+python memory (tracemalloc), output bytes and throughput in points/s\n
+run from the project root:  python -m benchmarks.bench_suite [--scale small|medium|large] [--json out.json]
+    [--compare baseline.json] [--tolerance 1.25] [--workers N] [--fast] [--stages]\n
+--json saves the results, --compare checks them against saved ones and exits 1 if anything
+got slower than tolerance times the baseline, so a run before and after a change catches regressions'''
+import sys, json, time, timeit, tempfile, tracemalloc, argparse
+from pathlib import Path
+import pandas as pd, numpy as np
+import xarray as xr
+
+import timecapsule as tc
+
+# (gauges, timesteps, nanfrac, x): x is 'datetime' (hourly) or 'numeric' (a stationing in ft)
+scales = {
+    'small':[(1,1_000,0.0,'datetime'),(20,8_760,0.05,'datetime'),(20,8_760,0.05,'numeric')],
+    'medium':[(1,100_000,0.05,'datetime'),(100,8_760,0.05,'datetime'),(100,8_760,0.2,'numeric'),(20,87_600,0.05,'datetime')],
+    'large':[(1,1_000_000,0.05,'datetime'),(500,8_760,0.05,'datetime'),(500,8_760,0.05,'numeric'),(50,100_000,0.05,'datetime')],
+}
+xdims = {'datetime':'Time (UTC)','numeric':'Station (ft)'}
+
+def synthSuite(gauges=20,timesteps=8_760,nanfrac=0.05,x='datetime',plans=2,seed=0):
+    '''a depositDSsuite Dataset of random walk Sim and Obs over (plan, Gauge, x), with nanfrac of the values NaN'''
+    rng = np.random.default_rng(seed)
+    if x == 'datetime':
+        index = pd.date_range('2000-01-01',periods=timesteps,freq='h')
+    else:
+        index = np.arange(timesteps,dtype=float)*10.
+    shape = (plans,gauges,timesteps)
+    obs = rng.normal(size=shape[1:]).cumsum(axis=-1)
+    sim = obs + rng.normal(scale=0.5,size=shape).cumsum(axis=-1)*0.1
+    obs = np.broadcast_to(obs,shape).copy()
+    for vals in (sim,obs):
+        vals[rng.random(shape)<nanfrac] = np.nan
+    dims = ('plan','Gauge',xdims[x])
+    coords = {'plan':[f'p{i}' for i in range(plans)],'Gauge':[f'g{i}' for i in range(gauges)],xdims[x]:index}
+    return xr.Dataset({'Sim':(dims,sim),'Obs':(dims,obs)},coords=coords)
+
+def outBytes(pth):
+    pth = Path(pth)
+    return pth.stat().st_size if pth.is_file() else sum(f.stat().st_size for f in pth.rglob('*') if f.is_file())
+
+def measure(func,repeat=3):
+    '''(best seconds of repeat runs, peak MB of python allocations in 1 more traced run)'''
+    seconds = min(timeit.repeat(func,number=1,repeat=repeat))
+    tracemalloc.start()
+    try:
+        func()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return seconds, peak/1e6
+
+def benchCase(tmp,gauges,timesteps,nanfrac,x,repeat=3,workers=None,fast=False,stages=False):
+    '''rows of results for 1 synthetic suite, 1 per function timed'''
+    ds = synthSuite(gauges,timesteps,nanfrac,x)
+    tdim = xdims[x]
+    case = f'{gauges}g x {timesteps} {x} nan{nanfrac:g}'
+    tmp = Path(tmp)/case.replace(' ','_')
+    tmp.mkdir()
+    suitepth, tcjson, html = tmp/'suite', tmp/'ts_gauge.json', tmp/'p0.html'
+    df = ds.isel(plan=0,Gauge=0).drop_vars(['plan','Gauge']).to_pandas()
+    runs = {
+        'deposit':(lambda: tc.deposit(tcjson,df,ytitle='WSEL (ft)'),df.size,tcjson),
+        'depositDSsuite':(lambda: tc.depositDSsuite(ds,suitepth,tdim=tdim,workers=workers),
+            ds['Sim'].size+ds['Obs'].size,suitepth),
+        'toDF':(lambda: tc.toDF(tcjson,parseDates=x=='datetime'),df.size,None),
+        'plot':(lambda: tc.plot(tcjson,title='gauge'),df.size,None),
+        'toHTML':(lambda: tc.toHTML(suitepth/'p0',html,openHTML=False,workers=workers,fast=fast),
+            gauges*df.size,html),
+    }
+    rows = []
+    for func,(run,points,out) in runs.items():
+        with tc.Tracer() as tracer:
+            seconds,peak = measure(run,repeat)
+        rows.append({'case':case,'func':func,'seconds':seconds,'points':points,
+            'points/s':points/seconds,'MB out':outBytes(out)/1e6 if out else np.nan,'peak MB':peak})
+        if stages and len(tracer.records()):
+            print(f'{case} {func}, over {repeat+1} runs:\n{tracer.summary()}\n')
+    return rows
+
+def compare(results,baseline,tolerance=1.25):
+    '''results joined to baseline by case and func, with the ratio of their seconds'''
+    joined = results.merge(baseline[['case','func','seconds']],on=['case','func'],suffixes=('','_base'))
+    joined['ratio'] = joined['seconds']/joined['seconds_base']
+    joined['regressed'] = joined['ratio'] > tolerance
+    return joined
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--scale',choices=list(scales),default='small')
+    parser.add_argument('--repeat',type=int,default=3)
+    parser.add_argument('--workers',type=int,default=None)
+    parser.add_argument('--fast',action='store_true',help='toHTML(fast=True)')
+    parser.add_argument('--stages',action='store_true',help='print a Tracer summary of each function')
+    parser.add_argument('--json',type=Path,help='save the results here')
+    parser.add_argument('--compare',type=Path,help='results saved by an earlier --json run')
+    parser.add_argument('--tolerance',type=float,default=1.25)
+    args = parser.parse_args()
+
+    rows = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for gauges,timesteps,nanfrac,x in scales[args.scale]:
+            rows += benchCase(tmp,gauges,timesteps,nanfrac,x,args.repeat,args.workers,args.fast,args.stages)
+    results = pd.DataFrame(rows)
+    with pd.option_context('display.width',200,'display.max_rows',None,'display.float_format','{:,.3f}'.format):
+        print(results.to_string(index=False))
+    if args.json:
+        args.json.write_text(json.dumps({'scale':args.scale,'timecapsule':str(Path(tc.__file__).parent),
+            'json backend':tc.getJSONbackend(),'time':time.strftime('%Y-%m-%d %X'),
+            'results':results.to_dict('records')},indent=1,default=str))
+    if args.compare:
+        joined = compare(results,pd.DataFrame(json.loads(args.compare.read_text())['results']),args.tolerance)
+        with pd.option_context('display.width',200,'display.max_rows',None,'display.float_format','{:,.3f}'.format):
+            print(joined[['case','func','seconds_base','seconds','ratio','regressed']].to_string(index=False))
+        if joined['regressed'].any():
+            sys.exit(1)
@@ -14,6 +14,10 @@ requirements = []
 
 test_requirements = ['pytest>=3', ]
 
+# optional: compress is picked up automatically when installed, fast reads with orjson when installed
+#   and writes with it after setJSONbackend('orjson')
+extras_requirements = {'fast': ['orjson'], 'compress': ['brotli', 'zstandard']}
+
 setup(
     author="Sean Micek",
     author_email='seanrm100@gmail.com',
@@ -32,6 +36,7 @@ setup(
     ],
     description="Minimal specification for timeseries data for the web, chunked into lightweight jsons. Provided as a Python library which interprets it into Plotly plots.",
     install_requires=requirements,
+    extras_require=extras_requirements,
     license="MIT license",
     long_description=readme + '\n\n' + history,
     include_package_data=True,
@@ -1,4 +1,779 @@
 #!/usr/bin/env python
 
+import sys, os, json, re, gzip, time, asyncio
 import pytest
+import pandas as pd, numpy as np
 
+import timecapsule as tc
+from timecapsule import nan2None, NanConverter
+
+# the module itself, for private helpers, wherever the package was imported from
+tcmod = sys.modules[tc.deposit.__module__]
+
+
+@pytest.fixture
+def stdlibJSON():
+    '''byte for byte comparisons need the stdlib json backend'''
+    backend = tc.getJSONbackend()
+    tc.setJSONbackend('json')
+    yield
+    tc.setJSONbackend(backend)
+
+
+@pytest.fixture
+def tcdf():
+    rng = np.random.default_rng(0)
+    idx = pd.date_range('2000-01-01', periods=50, freq='h', name='Time (UTC)')
+    df = pd.DataFrame({
+        'Sim': rng.normal(size=50),
+        'Obs': rng.normal(size=50),
+        'Count': rng.integers(0, 5, 50),
+        'Flag': pd.array([1, None] * 25, dtype='Int64'),
+    }, index=idx)
+    df.iloc[::7, 0] = np.nan
+    df.iloc[3, 1] = np.inf
+    df.columns.name = 'Source'
+    return df
+
+
+def _legacyDump(jsn, df, outJSON, indent=None):
+    '''serialize jsn the way deposit() used to: recursive nan2None + NanConverter'''
+    jsn = dict(jsn)
+    X = df.index.strftime('%Y-%m-%d %X').to_list() if isinstance(df.index, pd.DatetimeIndex) \
+        else df.index.to_list()
+    jsn['x'] = nan2None(X)
+    jsn['data'] = [{**trace, 'y': nan2None(df[col].to_list())}
+        for trace, col in zip(jsn['data'], df.columns)]
+    with open(outJSON, 'w') as outfile:
+        json.dump(jsn, outfile, cls=NanConverter, indent=indent)
+
+
+@pytest.mark.usefixtures('stdlibJSON')
+@pytest.mark.parametrize('indent', [None, 2])
+@pytest.mark.parametrize('index', ['datetime', 'tz', 'numeric'])
+def test_deposit_byte_compatible(tcdf, tmp_path, indent, index):
+    if index == 'tz':
+        tcdf.index = tcdf.index.tz_localize('US/Central')
+    elif index == 'numeric':
+        tcdf.index = np.r_[np.nan, np.arange(len(tcdf) - 1.)]
+    kw = dict(attrz={'NSE': np.nan, 'Name': 'g1'}, data={'line': {'width': 1}}, ytitle='WSEL (ft)')
+    jsn = tc.deposit(tmp_path / 'new.json', tcdf, JSONindent=indent, **kw)
+    _legacyDump(jsn, tcdf, tmp_path / 'old.json', indent=indent)
+    assert (tmp_path / 'new.json').read_bytes() == (tmp_path / 'old.json').read_bytes()
+
+
+def test_deposit_nans_to_None(tcdf):
+    idx = tcdf.index.to_series()
+    idx.iloc[5] = pd.NaT
+    tcdf.index = pd.DatetimeIndex(idx)
+    jsn = tc.deposit(None, tcdf)
+    assert jsn['x'][5] is None
+    assert jsn['data'][0]['y'][0] is None
+    assert jsn['data'][1]['y'][3] == np.inf
+
+
+@pytest.fixture
+def suite():
+    xr = pytest.importorskip('xarray')
+    rng = np.random.default_rng(0)
+    dims = ('plan', 'Gauge', 'Time (UTC)')
+    shape = (2, 5, 40)
+    return xr.Dataset(
+        {'Sim': (dims, rng.normal(size=shape)), 'Obs': (dims, rng.normal(size=shape))},
+        coords={'plan': ['p1', 'p2'],
+            'Gauge': [f'g{i}' for i in range(shape[1])],
+            'Time (UTC)': pd.date_range('2000-01-01', periods=shape[2], freq='h')})
+
+
+def _readSuite(outsuitepth):
+    return {str(f.relative_to(outsuitepth)): f.read_bytes() for f in sorted(outsuitepth.rglob('*.json'))}
+
+
+@pytest.mark.parametrize('executor', ['thread', 'process'])
+def test_depositDSsuite_workers_match_serial(suite, tmp_path, executor):
+    tc.depositDSsuite(suite, tmp_path / 'serial')
+    tc.depositDSsuite(suite, tmp_path / 'pool', workers=2, executor=executor, chunksize=2)
+    serial = _readSuite(tmp_path / 'serial')
+    assert len(serial) == 10
+    assert serial == _readSuite(tmp_path / 'pool')
+
+
+def test_depositDStrial_aggregates_failures(suite, tmp_path):
+    trial = suite.sel(plan='p1').drop_vars('plan')
+    # ts_no/such.json has no parent dir to write into
+    trial['Gauge'] = ['g0', 'no/such', 'g2', 'g3', 'g4']
+    with pytest.raises(tc.DepositError) as err:
+        tc.depositDStrial(trial, tmp_path, workers=2, executor='thread', chunksize=1)
+    assert list(err.value.failures) == [tmp_path / 'ts_no/such.json']
+    assert sorted(f.name for f in tmp_path.glob('*.json')) == ['ts_g0.json', 'ts_g2.json', 'ts_g3.json', 'ts_g4.json']
+
+
+def test_depositDStrial_dask_chunks_match(suite, tmp_path):
+    pytest.importorskip('dask')
+    trial = suite.sel(plan='p1').drop_vars('plan')
+    trial['Datum'] = ('Gauge', np.arange(5.))
+    tc.depositDStrial(trial, tmp_path / 'eager')
+    tc.depositDStrial(trial.chunk({'Gauge': 2}), tmp_path / 'dask')
+    assert _readSuite(tmp_path / 'eager') == _readSuite(tmp_path / 'dask')
+    df = tc.toDF(tmp_path / 'eager' / 'ts_g3.json')
+    assert list(df.columns) == ['Sim', 'Obs', 'Datum']
+    assert (df['Datum'] == 3).all()
+
+
+@pytest.mark.parametrize('memory', [2**30, 1000])
+def test_depositDSsuite_computes_each_chunk_once(suite, tmp_path, memory):
+    dask = pytest.importorskip('dask.array')
+    tc.depositDSsuite(suite, tmp_path / 'eager')
+    calls = []
+    def tap(block, block_info=None):
+        calls.append(tuple(block_info[0]['chunk-location']))
+        return block
+    chunked = suite.copy()
+    for var in ('Sim', 'Obs'):
+        data = dask.from_array(suite[var].values, chunks=(1, 2, 20))
+        chunked[var] = (suite[var].dims, data.map_blocks(tap, meta=np.array((), dtype=float)))
+    tc.depositDSsuite(chunked, tmp_path / 'dask', memory=memory)
+    assert _readSuite(tmp_path / 'eager') == _readSuite(tmp_path / 'dask')
+    counts = pd.Series(calls).value_counts()
+    # 2 plans x 3 gauge chunks x 2 time chunks, per var
+    assert len(counts) == 12 and set(counts) == ({2} if memory > 2**20 else {2, 4})
+
+    cell = tcmod._cellBytes(chunked)
+    blocks = tcmod._fileBlocks(chunked, ['plan', 'Gauge'], cell, memory=memory / 2)
+    # 1 gauge is 640 bytes, so the tiny budget splits the 2 gauge chunks, which then compute twice
+    expected = [slice(0, 5)] if memory > 2**20 else [slice(i, i + 1) for i in range(5)]
+    assert [block['plan'] for block in blocks] == [slice(0, 1)] * len(expected) + [slice(1, 2)] * len(expected)
+    assert [block['Gauge'] for block in blocks[:len(expected)]] == expected
+
+
+def test_depositDSsuite_memory_with_workers(suite, tmp_path, monkeypatch):
+    blockFrames, depositGaugeDF = tcmod._blockFrames, tcmod._depositGaugeDF
+    blockOf, pending, alive = {}, [], []
+    def frames(*args, **kw):
+        # blocks with capsules still to write when this one is computed
+        alive.append(sum(1 for left in pending if left))
+        pending.append(0)
+        for idx, df in blockFrames(*args, **kw):
+            blockOf[id(df)] = len(pending) - 1
+            pending[-1] += 1
+            yield idx, df
+    def deposited(df, *args):
+        time.sleep(.01)
+        depositGaugeDF(df, *args)
+        pending[blockOf[id(df)]] -= 1
+    monkeypatch.setattr(tcmod, '_blockFrames', frames)
+    monkeypatch.setattr(tcmod, '_depositGaugeDF', deposited)
+    # 2 capsules (640 bytes each) per block
+    tc.depositDSsuite(suite, tmp_path, workers=2, executor='thread', memory=4 * 640)
+    assert len(alive) == 6 and max(alive) <= 1 and not any(pending)
+
+
+def test_depositDataset_any_dims(suite, tmp_path):
+    xr = pytest.importorskip('xarray')
+    ds = xr.concat([suite, suite + 1], pd.Index(['lo', 'hi'], name='member')).rename({'Gauge': 'site'})
+    tc.depositDataset(ds['Sim'].to_dataset(), tmp_path, filedims=('plan', 'site'), tracedim='member',
+                      pathTemplate='{plan}/{site}.json')
+    df = tc.toDF(tmp_path / 'p2' / 'g3.json')
+    assert list(df.columns) == ['lo', 'hi']
+    assert np.allclose(df['hi'] - 1, suite['Sim'].sel(plan='p2', Gauge='g3').values)
+
+    tc.depositDataset(ds.sel(plan='p1', drop=True), tmp_path / 'both', filedims=('site',), tracedim='member')
+    assert list(tc.toDF(tmp_path / 'both' / 'ts_g0.json').columns) == ['Sim lo', 'Sim hi', 'Obs lo', 'Obs hi']
+    with pytest.raises(ValueError, match='member'):
+        tc.depositDataset(ds, tmp_path / 'stray', filedims=('plan', 'site'))
+    with pytest.raises(ValueError, match=r"lacks filedims \['plan'\]"):
+        tc.depositDataset(ds, tmp_path / 'collide', filedims=('plan', 'site'), tracedim='member',
+                          pathTemplate='ts_{site}.json')
+    with pytest.raises(ValueError, match='duplicate coordinates'):
+        tc.depositDataset(ds.assign_coords(site=['g0'] * 5), tmp_path / 'collide', filedims=('plan', 'site'),
+                          tracedim='member')
+    assert not (tmp_path / 'collide').exists()
+
+
+@pytest.mark.parametrize('STAdim', ['Gauge.id', '0', 'a/b'])
+def test_depositDataset_literal_names(suite, tmp_path, STAdim):
+    # dim names and file names aren't format strings
+    tc.depositDSsuite(suite, tmp_path / 'plain')
+    tc.depositDSsuite(suite.rename({'Gauge': STAdim}), tmp_path / 'renamed', STAdim=STAdim)
+    assert _readSuite(tmp_path / 'plain') == _readSuite(tmp_path / 'renamed')
+    assert tcmod._splitTemplate('{plan}/x{}/{a/b}.json', ['plan', 'a/b']) == (['', 'plan', '/x{}'], ['', 'a/b', '.json'])
+
+    gauge = suite.sel(plan='p1', Gauge='g2')
+    for name in ['ts_{x}.json', 'ts_}.json', 'ts_{Gauge}.json']:
+        tc.depositDS(gauge, tmp_path / name)
+        assert (tmp_path / name).read_bytes() == (tmp_path / 'plain' / 'p1' / 'ts_g2.json').read_bytes()
+
+
+def test_xcache(tcdf):
+    tc.xcache.clear()
+    X = tc.deposit(None, tcdf)['x']
+    assert len(tc.xcache) == 1
+    X[0] = 'mutated'
+    assert tc.deposit(None, tcdf.shift(1))['x'][0] == '2000-01-01 00:00:00'
+    assert len(tc.xcache) == 1
+    tc.deposit(None, tcdf.iloc[:10])
+    assert len(tc.xcache) == 2
+    # sized in bytes of the cached strings, not points
+    X = tc.deposit(None, tcdf)['x']
+    assert 70 < tc.xcache.size / (len(X) + 10) < 120
+    maxsize, tc.xcache.maxsize = tc.xcache.maxsize, tcmod._listBytes(X) - 1
+    try:
+        tc.xcache.clear()
+        tc.deposit(None, tcdf)
+        assert len(tc.xcache) == 0
+    finally:
+        tc.xcache.maxsize = maxsize
+
+    lru = tcmod._LRU(maxsize=5, sizeof=len)
+    lru['a'], lru['b'] = [1, 2], [3, 4]
+    lru.get('a')
+    lru['c'] = [5, 6]
+    assert 'b' not in lru and 'a' in lru and lru.size == 4
+
+
+def test_depositDStrial_sharedX(suite, tmp_path):
+    trial = suite.sel(plan='p1').drop_vars('plan')
+    tc.depositDStrial(trial, tmp_path / 'full')
+    tc.depositDStrial(trial, tmp_path / 'shared', sharedX=True)
+    capsule = json.loads((tmp_path / 'shared' / 'ts_g1.json').read_text())
+    assert capsule['xref'] == '_x.json' and 'x' not in capsule
+    pd.testing.assert_frame_equal(
+        tc.toDF(tmp_path / 'full' / 'ts_g1.json'), tc.toDF(tmp_path / 'shared' / 'ts_g1.json'))
+
+
+@pytest.mark.usefixtures('stdlibJSON')
+@pytest.mark.parametrize('xref', [None, '_x.json'])
+@pytest.mark.parametrize('chunked', [False, True])
+def test_depositStream_matches_deposit(tcdf, tmp_path, chunked, xref):
+    tcdf = tcdf.rename(columns={'Count': 'x'})
+    kw = dict(attrz={'NSE': np.nan, 'Name': 'g1'}, data={'line': {'width': 1}}, ytitle='WSEL (ft)', xref=xref)
+    tc.deposit(tmp_path / 'deposit.json', tcdf, **kw)
+    source = (tcdf.iloc[i:i + 7] for i in range(0, len(tcdf), 7)) if chunked else tcdf
+    tc.depositStream(tmp_path / 'stream.json', source, chunksize=7, **kw)
+    assert (tmp_path / 'stream.json').read_bytes() == (tmp_path / 'deposit.json').read_bytes()
+
+
+def test_depositStream_rejects_funcs_for_chunks(tcdf, tmp_path):
+    with pytest.raises(TypeError):
+        tc.depositStream(tmp_path / 'stream.json', iter([tcdf]), attrz=lambda df: {})
+
+
+def test_orjson_backend_same_capsule(tcdf, tmp_path):
+    pytest.importorskip('orjson')
+    backend = tc.getJSONbackend()
+    # orjson is opt in, so default capsules stay byte for byte stable when it's installed
+    assert backend == 'json'
+    tcdf['Stage ≥ flood'] = tcdf['Sim'].astype('float32')
+    tcdf['Tiny'] = tcdf['Obs'] * 1e-5
+    kw = dict(attrz={'NSE': np.nan, 'Name': 'g1'}, data={'line': {'width': 1}})
+    try:
+        for name in ['json', 'orjson']:
+            tc.setJSONbackend(name)
+            tc.deposit(tmp_path / f'{name}.json', tcdf, **kw)
+            tc.depositStream(tmp_path / f'{name}_stream.json', tcdf, chunksize=7, **kw)
+    finally:
+        tc.setJSONbackend(backend)
+    assert (tmp_path / 'json.json').read_bytes() != (tmp_path / 'orjson.json').read_bytes()
+    expected = json.loads((tmp_path / 'json.json').read_text())
+    for name in ['orjson', 'orjson_stream']:
+        assert json.loads((tmp_path / f'{name}.json').read_text()) == expected
+    pd.testing.assert_frame_equal(tc.toDF(tmp_path / 'orjson.json'), tc.toDF(tmp_path / 'json.json'))
+
+
+@pytest.mark.parametrize('backend', ['json', 'orjson'])
+def test_toDF_keeps_wide_ints(tmp_path, backend):
+    if backend == 'orjson':
+        pytest.importorskip('orjson')
+    pth = tmp_path / 'wide.json'
+    pth.write_text('{"x": [1, 2], "data": [{"name": "Actual", "y": [99999999999999999, 123456789012345678901234]}]}')
+    default = tc.getJSONbackend()
+    try:
+        tc.setJSONbackend(backend)
+        assert tc.toDF(pth)['Actual'].to_list() == [99999999999999999, 123456789012345678901234]
+    finally:
+        tc.setJSONbackend(default)
+
+
+@pytest.mark.parametrize('indent', [None, 2])
+def test_toDF_roundtrip(tcdf, tmp_path, indent):
+    tcdf = tcdf.drop(columns='Flag')
+    tcdf.columns.name = None
+    tc.deposit(tmp_path / 'tc.json', tcdf, attrz={'Name': 'g1'}, JSONindent=indent)
+    df = tc.toDF(tmp_path / 'tc.json')
+    pd.testing.assert_frame_equal(df, tcdf, check_freq=False)
+    assert df.attrs == {'Name': 'g1'}
+
+    df = tc.toDF(tmp_path / 'tc.json', columns=['Obs'], xrange=('2000-01-01 10:00', '2000-01-01 12:00'))
+    pd.testing.assert_frame_equal(df, tcdf[['Obs']].iloc[10:13], check_freq=False)
+    with pytest.raises(KeyError):
+        tc.toDF(tmp_path / 'tc.json', columns=['nope'])
+
+
+def test_scanner_patterns():
+    # possessive quantifiers would only compile on python 3.11+
+    for pattern in (tcmod._flatArray, tcmod._scalar, tcmod._ws, tcmod._key, tcmod._sep):
+        assert not re.search(rb'[*+?}]\+', pattern.pattern)
+    buf = b'["a\\"]", null, 1.5e-05]  ,'
+    assert tcmod._flatArray.match(buf).end() == buf.index(b']  ') + 1
+    assert tcmod._flatArray.match(b'[1, [2]]') is None
+    assert tcmod._key.match(b' "k\\"": [').group(1) == b'"k\\""'
+
+
+def test_toDF_dict_not_copied_or_mutated(tcdf):
+    jsn = tc.deposit(None, tcdf[['Sim']], attrz={'Name': 'g1'})
+    df = tc.toDF(jsn, parseDates=False)
+    df.attrs['Name'] = 'changed'
+    assert jsn['attrz'] == {'Name': 'g1'}
+    assert df.index[0] == '2000-01-01 00:00:00'
+
+
+@pytest.mark.parametrize('binary', ['float64', 'float32'])
+def test_binary_capsule(tcdf, tmp_path, binary):
+    tcdf = tcdf.drop(columns='Flag')
+    tcdf['Name'] = 'g1'
+    tc.deposit(tmp_path / 'json.json', tcdf, attrz={'Name': 'g1'})
+    tc.deposit(tmp_path / 'bin.json', tcdf, attrz={'Name': 'g1'}, binary=binary)
+    header = json.loads((tmp_path / 'bin.json').read_text())
+    assert header['buffer'] == 'bin.bin'
+    assert header['x'] == {'dtype': '<f8', 'offset': 0, 'count': 50, 'unit': 'ms'}
+    assert header['data'][0]['y']['dtype'] == np.dtype(binary).newbyteorder('<').str
+    assert header['data'][3]['y'] == ['g1'] * 50
+
+    expected = tc.toDF(tmp_path / 'json.json')
+    df = tc.toDF(tmp_path / 'bin.json')
+    pd.testing.assert_frame_equal(df, expected, check_dtype=False,
+        rtol=1e-6 if binary == 'float32' else 0, atol=0, check_freq=False, check_index_type=False)
+    pd.testing.assert_frame_equal(tc.toDF(tmp_path / 'bin.json', columns=['Obs']), df[['Obs']])
+    assert tc.plot(tmp_path / 'bin.json').data[0].x[0] == '2000-01-01 00:00:00'
+
+
+@pytest.mark.parametrize('method', ['lttb', 'minmax'])
+def test_downsample(tmp_path, method):
+    index = pd.date_range('2000', periods=10_000, freq='min')
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame({'Sim': np.sin(np.linspace(0, 20, 10_000)) + rng.normal(0, .01, 10_000)}, index=index)
+    df.iloc[1234, 0] = 50
+    df.iloc[5000:5100, 0] = np.nan
+    jsn = tc.deposit(tmp_path / 'tc.json', df, downsample=500, downsampler=method,
+        attrz=lambda full: {'Peak': float(full['Sim'].max()), 'Len': len(full)})
+    assert jsn['downsample'] == {'method': method, 'points': 500, 'originalLength': 10_000}
+    assert jsn['attrz'] == {'Peak': 50.0, 'Len': 10_000}
+    assert len(jsn['x']) <= 500
+    back = tc.toDF(tmp_path / 'tc.json')
+    assert back.index.is_monotonic_increasing
+    assert back['Sim'].max() == 50
+    assert back.index[back['Sim'].argmax()] == index[1234]
+    assert back['Sim'].isna().any()
+    pd.testing.assert_series_equal(back['Sim'], df['Sim'].loc[back.index], check_freq=False, check_index_type=False)
+
+    assert 'downsample' not in tc.deposit(None, df.iloc[:100], downsample=500)
+    with pytest.raises(ValueError):
+        tc.deposit(None, df, downsample=500, xref='_x.json')
+
+
+def test_pyramid(tmp_path):
+    index = pd.date_range('2000', periods=5000, freq='h')
+    df = pd.DataFrame({'Sim': np.sin(np.arange(5000) / 50), 'Obs': np.cos(np.arange(5000) / 50)}, index=index)
+    jsn = tc.deposit(tmp_path / 'ts_a.json', df, attrz={'Name': 'a'}, pyramid=500)
+    pyr = jsn['pyramid']
+    assert pyr['dir'] == '_ts_a' and [len(level['tiles']) for level in pyr['levels']] == [2, 4, 8, 16]
+    assert pyr['levels'][-1]['tiles'][0] == {'file': '4_0.json', 'x0': '2000-01-01 00:00:00',
+        'x1': '2000-01-13 23:00:00', 'rows': 312}
+    assert len(jsn['x']) <= 1000 and jsn['downsample']['originalLength'] == 5000
+
+    window = ('2000-02-01', '2000-02-03 23:00')
+    expected = df.loc[window[0]:window[1]]
+    zoomed = tc.zoomDF(tmp_path / 'ts_a.json', window)
+    pd.testing.assert_frame_equal(zoomed, expected, check_freq=False, check_index_type=False)
+    assert zoomed.attrs == {'Name': 'a'}
+    pd.testing.assert_frame_equal(tc.zoomDF(tmp_path / 'ts_a.json', maxpoints=500), tc.toDF(tmp_path / 'ts_a.json'))
+    assert tc.zoomDF(tmp_path / 'ts_a.json').index.is_monotonic_increasing
+    fig = tc.plot(tmp_path / 'ts_a.json', xrange=window)
+    assert len(fig.data[0].x) == len(expected)
+
+
+def test_toHTML_workers_match_serial(tcdf, tmp_path):
+    for g in 'abc':
+        tc.deposit(tmp_path / f'ts_{g}.json', tcdf[['Sim', 'Obs']], attrz={'Name': g, 'NSE': .5})
+    uuid = re.compile(r'[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}')
+    docs = []
+    for workers in [None, 2]:
+        out = tmp_path / f'{workers}.html'
+        tc.toHTML(tmp_path, out, bounds={'NSE': {'lbound': .6}}, openHTML=False, workers=workers, executor='thread')
+        docs += [uuid.sub('', out.read_text())]
+    assert docs[0] == docs[1]
+    assert docs[0].count('cdn.plot.ly') == 1 and docs[0].count('Plotly.newPlot') == 3
+    assert not list(tmp_path.glob('.*.tmp'))
+
+
+@pytest.mark.parametrize('title', ['Gauge 1', ''])
+def test_plotSpec_matches_plot(tcdf, title):
+    jsn = tc.deposit(None, tcdf, attrz={'Name': 'g1', 'NSE': .5, 'RMSE': None}, ytitle='WSEL (ft)',
+        data={'line': {'width': 1}}, layout={'annotations': [{'text': 'note', 'x': 0, 'y': 0}]})
+    bounds = {'NSE': {'lbound': .6}}
+    normalize = lambda fig: json.loads(json.dumps(fig, default=str))
+    assert normalize(tc.plotSpec(jsn, title=title, bounds=bounds)) == \
+        normalize(tc.plot(jsn, title=title, bounds=bounds).to_plotly_json())
+    assert jsn['attrz'] == {'Name': 'g1', 'NSE': .5, 'RMSE': None}
+    # an attrz only capsule has no subplot title to retitle
+    attrzOnly = {'attrz': {'Name': 'x', 'NSE': .4}}
+    assert normalize(tc.plotSpec(attrzOnly, title=title, bounds=bounds)) == \
+        normalize(tc.plot(attrzOnly, title=title, bounds=bounds).to_plotly_json())
+
+
+def test_toHTML_lazy(tcdf, tmp_path):
+    capsules = tmp_path / 'trial'
+    capsules.mkdir()
+    for g in ['a', 'b']:
+        tc.deposit(capsules / f'ts_{g}.json', tcdf[['Sim', 'Obs']], attrz={'Name': g, 'NSE': .5})
+    tc.deposit(capsules / 'insights.json', tcdf[['Sim']], attrz={'Name': 'insights'})
+    out = tmp_path / 'report' / 'trial.html'
+    out.parent.mkdir()
+    tc.toHTML(capsules, out, bounds={'NSE': {'lbound': .6}}, openHTML=False, lazy=True)
+    doc = out.read_text()
+    specs = re.findall(r'data-src="([^"]+)".*?<script type="application/json" class="tc-spec">(.*?)</script>', doc)
+    assert [src for src, _ in specs] == ['../trial/insights.json', '../trial/ts_a.json', '../trial/ts_b.json']
+    spec = json.loads(specs[1][1])
+    assert [trace.get('x') for trace in spec['data']] == [None, None, None]
+    assert spec['data'][2]['cells']['fill']['color'] == [['rgba(255, 0, 34,0.4)']] * 2
+    assert 'template' not in spec['layout'] and doc.count('"template"') == 0
+    assert doc.count('IntersectionObserver') == 2 and '2000-01-01 00:00:00' not in doc
+
+
+def test_depositDSsuite_incremental(suite, tmp_path):
+    out = tmp_path / 'suite'
+    tc.depositDSsuite(suite, out, incremental=True, sharedX=True)
+    stamps = lambda: {str(f.relative_to(out)): f.stat().st_mtime_ns for f in out.rglob('*.json')}
+    first = stamps()
+    suite = suite.copy(deep=True)
+    suite['Sim'][1, 2, 5] = 99.
+    tc.depositDSsuite(suite, out, incremental=True, sharedX=True)
+    changed = {name for name, stamp in stamps().items() if stamp != first.get(name)}
+    assert changed == {'p2/ts_g2.json', 'p1/_manifest.json', 'p2/_manifest.json'}
+    assert tc.toDF(out / 'p2' / 'ts_g2.json')['Sim'].iloc[5] == 99.
+    manifest = json.loads((out / 'p2' / '_manifest.json').read_text())
+    assert sorted(manifest['capsules']) == [f'ts_g{i}.json' for i in range(5)]
+
+    trial = suite.sel(plan='p1').drop_vars('plan')
+    tc.depositDStrial(trial, out / 'p1', incremental=True, sharedX=True, ytitle='Stage')
+    assert all(out.joinpath('p1', f'ts_g{i}.json').stat().st_mtime_ns != first[f'p1/ts_g{i}.json'] for i in range(5))
+
+
+def test_toHTML_incremental(tcdf, tmp_path):
+    tc.deposit(tmp_path / 'ts_a.json', tcdf[['Sim']], attrz={'Name': 'a'})
+    out = tmp_path / 'a.html'
+    tc.toHTML(tmp_path, out, openHTML=False, incremental=True, fast=True)
+    stamp = out.stat().st_mtime_ns
+    tc.toHTML(tmp_path, out, openHTML=False, incremental=True, fast=True)
+    assert out.stat().st_mtime_ns == stamp
+    tc.toHTML(tmp_path, out, openHTML=False, incremental=True, fast=True, height=500)
+    assert out.stat().st_mtime_ns != stamp
+    stamp = out.stat().st_mtime_ns
+    tc.deposit(tmp_path / 'ts_b.json', tcdf[['Sim']], attrz={'Name': 'b'})
+    tc.toHTML(tmp_path, out, openHTML=False, incremental=True, fast=True, height=500)
+    assert out.stat().st_mtime_ns != stamp
+
+
+def test_append_splices_json(tcdf, tmp_path, stdlibJSON):
+    data = {'line': {'width': 1}}
+    tc.deposit(tmp_path / 'appended.json', tcdf.iloc[:30], attrz={'Name': 'g1'}, data=data)
+    tc.append(tmp_path / 'appended.json', tcdf.iloc[30:45])
+    tc.append(tmp_path / 'appended.json', tcdf.iloc[45:][['Obs', 'Sim', 'Flag', 'Count']], attrz={'Name': 'g2'})
+    tc.deposit(tmp_path / 'whole.json', tcdf, attrz={'Name': 'g2'}, data=data)
+    assert (tmp_path / 'appended.json').read_bytes() == (tmp_path / 'whole.json').read_bytes()
+
+    tc.append(tmp_path / 'whole.json', tcdf[['Sim']].iloc[:2].shift(50, freq='h'))
+    df = tc.toDF(tmp_path / 'whole.json')
+    assert len(df) == 52 and df['Obs'].iloc[-2:].isna().all()
+    with pytest.raises(ValueError):
+        tc.append(tmp_path / 'whole.json', pd.DataFrame({'New': [1.]}))
+
+
+@pytest.mark.parametrize('binary', [None, 'float32'])
+def test_append_rewrites_with_funcs_and_window(tcdf, tmp_path, binary):
+    tcdf = tcdf[['Sim', 'Obs']]
+    peak = lambda df: {'Name': 'g1', 'Peak': float(df['Obs'].max())}
+    tc.deposit(tmp_path / 'tc.json', tcdf.iloc[:40], attrz=peak, binary=binary,
+        data={'line': {'width': 1}})
+    tc.append(tmp_path / 'tc.json', tcdf.iloc[40:], attrz=peak, window='1D')
+    df = tc.toDF(tmp_path / 'tc.json')
+    expected = tcdf[tcdf.index > tcdf.index[-1] - pd.Timedelta('1D')]
+    pd.testing.assert_frame_equal(df, expected, check_freq=False, check_index_type=False, check_dtype=False,
+        check_names=False, rtol=1e-6)
+    assert df.attrs == peak(df)
+    assert tc.plot(tmp_path / 'tc.json').data[0].line.width == 1
+
+    tc.append(tmp_path / 'tc.json', tcdf.iloc[:0], window=10)
+    assert len(tc.toDF(tmp_path / 'tc.json')) == 10
+    with pytest.raises(ValueError, match='window'):
+        tc.append(tmp_path / 'tc.json', tcdf.iloc[:0], window=0)
+    assert len(tc.toDF(tmp_path / 'tc.json')) == 10
+
+
+def test_concat_along_x(tcdf, tmp_path, stdlibJSON):
+    data = {'line': {'width': 1}}
+    tc.deposit(tmp_path / 'a.json', tcdf.iloc[:30], attrz={'Name': 'g1'}, data=data)
+    tc.deposit(tmp_path / 'b.json', tcdf.iloc[20:], attrz={'Name': 'b'}, data=data)
+    tc.deposit(tmp_path / 'whole.json', tcdf, attrz={'Name': 'g1'}, data=data)
+    tc.concat([tmp_path / 'b.json', tmp_path / 'a.json'], tmp_path / 'out.json', attrz={'Name': 'g1'})
+    assert (tmp_path / 'out.json').read_bytes() == (tmp_path / 'whole.json').read_bytes()
+
+    shifted = tcdf[['Sim']].iloc[20:] + 100
+    tc.deposit(tmp_path / 'b.json', shifted)
+    for overlap, expected in [('last', shifted['Sim'].iloc[0]), ('first', tcdf['Sim'].iloc[20])]:
+        tc.concat([tmp_path / 'a.json', tmp_path / 'b.json'], tmp_path / 'out.json', overlap=overlap)
+        df = tc.toDF(tmp_path / 'out.json')
+        assert df['Sim'].iloc[20] == expected and df['Obs'].iloc[30:].isna().all()
+
+
+def test_concat_maps_each_input_once(tcdf, tmp_path, monkeypatch):
+    tcdf = tcdf[['Sim', 'Obs']]
+    tc.deposit(tmp_path / 'a.json', tcdf.iloc[:30], binary='float64')
+    tc.deposit(tmp_path / 'b.json.gz', tcdf.iloc[20:], attrz={'Name': 'b'})
+    mapped = []
+    real = tcmod._mapped
+    monkeypatch.setattr(tcmod, '_mapped', lambda pth: mapped.append(pth) or real(pth))
+    tc.concat([tmp_path / 'a.json', tmp_path / 'b.json.gz'], tmp_path / 'out.json')
+    assert mapped == [tmp_path / 'a.json', tmp_path / 'b.json.gz']
+    df = tc.toDF(tmp_path / 'out.json')
+    pd.testing.assert_frame_equal(df, tcdf, check_freq=False, check_names=False, check_index_type=False)
+
+
+def test_merge(tcdf, tmp_path):
+    tc.deposit(tmp_path / 'sim.json', tcdf[['Sim']].iloc[::2], attrz={'Name': 'g1'})
+    tc.deposit(tmp_path / 'obs.json', tcdf[['Obs', 'Count']].iloc[10:])
+    capsules = [tmp_path / 'sim.json', tmp_path / 'obs.json']
+    for how, index in [('outer', tcdf.index[::2].union(tcdf.index[10:])), ('inner', tcdf.index[10::2]), ('left', tcdf.index[::2])]:
+        tc.merge(capsules, tmp_path / 'out.json', how=how)
+        df = tc.toDF(tmp_path / 'out.json')
+        expected = tcdf[['Sim']].iloc[::2].join(tcdf[['Obs', 'Count']].iloc[10:], how='outer').reindex(index)
+        pd.testing.assert_frame_equal(df, expected, check_dtype=False, check_freq=False, check_names=False)
+        assert df.attrs == {'Name': 'g1'}
+    assert tc.toDF(tmp_path / 'out.json')['Count'].dtype == np.float64
+    tc.merge(capsules, tmp_path / 'out.json', how='inner')
+    assert tc.toDF(tmp_path / 'out.json')['Count'].dtype == np.int64
+    with pytest.raises(ValueError):
+        tc.merge([tmp_path / 'sim.json', tmp_path / 'sim.json'], tmp_path / 'out.json')
+
+
+def test_catalog(suite, tmp_path):
+    out = tmp_path / 'suite'
+    tc.depositDSsuite(suite, out, catalog=True, sharedX=True)
+    df = tc.queryCatalog(out)
+    assert len(df) == 10 and list(df['path'][:2]) == ['p1/ts_g0.json', 'p1/ts_g1.json']
+    assert df['traces'][0] == ['Sim', 'Obs'] and set(df['points']) == {40}
+    assert (df['x0'][0], df['x1'][0]) == ('2000-01-01 00:00:00', '2000-01-02 15:00:00')
+
+    # attrz from a metric pass over the capsules
+    for i, path in enumerate(df['path']):
+        jsn = tc.toDF(out / path)
+        tc.deposit(out / path, jsn, attrz={'Name': path, 'NSE': i / 10})
+    tc.updateCatalog(out)
+    bad = tc.queryCatalog(out, 'trial = ? AND NSE < ?', ('p2', 0.8), orderby='NSE DESC')
+    assert list(bad['stem']) == ['ts_g2', 'ts_g1', 'ts_g0'] and list(bad['Name'][:1]) == ['p2/ts_g2.json']
+
+    (out / 'p1' / 'ts_g0.json').unlink()
+    tc.updateCatalog(out)
+    assert len(tc.queryCatalog(out)) == 9
+
+    tc.toHTML(out / 'p2', tmp_path / 'p2.html', openHTML=False, fast=True, where='NSE < 0.8', orderby='NSE DESC')
+    doc = (tmp_path / 'p2.html').read_text()
+    titles = re.findall(r'(g\d) - Simulated vs Observed Stage', doc)
+    assert titles == ['g2', 'g1', 'g0']
+
+
+def test_suiteMetrics(suite, tmp_path):
+    suite = suite.copy(deep=True)
+    suite['Obs'][0, 1, :5] = np.nan
+    suite['Obs'][1, 2, :] = 1.
+    metrics = tc.suiteMetrics(suite)
+    for plan, gauge in [('p1', 'g1'), ('p2', 'g0')]:
+        df = suite.sel(plan=plan, Gauge=gauge)[['Sim', 'Obs']].to_pandas().dropna()
+        err = df['Sim'] - df['Obs']
+        expected = {'corr': df['Sim'].corr(df['Obs']), 'MAE': err.abs().mean(), 'RMSE': np.sqrt((err ** 2).mean()),
+            'NSE': 1 - (err ** 2).sum() / ((df['Obs'] - df['Obs'].mean()) ** 2).sum()}
+        got = metrics.sel(plan=plan, Gauge=gauge)
+        for key, val in expected.items():
+            assert float(got[key]) == pytest.approx(val)
+    flat = metrics.sel(plan='p2', Gauge='g2')
+    assert np.isnan(float(flat['NSE'])) and np.isnan(float(flat['corr'])) and float(flat['MAE']) > 0
+
+    tc.depositDSsuite(suite, tmp_path, metrics=True)
+    attrs = tc.toDF(tmp_path / 'p1' / 'ts_g1.json').attrs
+    assert list(attrs) == ['Name', 'corr', 'MAE', 'RMSE', 'NSE'] and attrs['Name'] == 'g1'
+    assert attrs['NSE'] == round(float(metrics.sel(plan='p1', Gauge='g1')['NSE']), 2)
+    assert tc.toDF(tmp_path / 'p2' / 'ts_g2.json').attrs['NSE'] is None
+    assert 'NSE > 0.5' in tc.boundsToEnglish(tc.metricBounds)
+
+
+@pytest.mark.parametrize('suffix', ['.gz', '.br', '.zst'])
+def test_compressed_capsules(tcdf, tmp_path, stdlibJSON, suffix):
+    if suffix == '.br':
+        pytest.importorskip('brotli')
+    if suffix == '.zst':
+        pytest.importorskip('zstandard')
+    tcdf = tcdf[['Sim', 'Obs']]
+    tc.deposit(tmp_path / 'plain.json', tcdf.iloc[:30], attrz={'Name': 'g1'})
+    tc.deposit(tmp_path / f'packed.json{suffix}', tcdf.iloc[:30], attrz={'Name': 'g1'})
+    assert tcmod._readBytes(tmp_path / f'packed.json{suffix}') == (tmp_path / 'plain.json').read_bytes()
+    assert (tmp_path / f'packed.json{suffix}').stat().st_size < (tmp_path / 'plain.json').stat().st_size
+
+    tc.append(tmp_path / f'packed.json{suffix}', tcdf.iloc[30:])
+    df = tc.toDF(tmp_path / f'packed.json{suffix}')
+    pd.testing.assert_frame_equal(df, tcdf, check_freq=False, check_names=False)
+    assert df.attrs == {'Name': 'g1'}
+    assert [trace.name for trace in tc.plot(tmp_path / f'packed.json{suffix}').data][:2] == ['Sim', 'Obs']
+
+
+def test_compressed_suite(suite, tmp_path):
+    out = tmp_path / 'suite'
+    tc.depositDSsuite(suite, out, compress='gzip', sharedX=True, catalog=True)
+    tc.toHTML(out / 'p1', tmp_path / 'p1.html', openHTML=False, fast=True)
+    assert sorted(f.name for f in (out / 'p1').iterdir())[:3] == ['_x.json.gz', 'ts_g0.json.gz', 'ts_g1.json.gz']
+    expected = suite.sel(plan='p1', Gauge='g1')[['Sim', 'Obs']].to_pandas()[['Sim', 'Obs']]
+    assert np.allclose(tc.toDF(out / 'p1' / 'ts_g1.json.gz').values, expected.values)
+    assert set(tc.queryCatalog(out)['stem']) == {f'ts_g{i}' for i in range(5)}
+    assert len(re.findall(r'g\d - Simulated vs Observed Stage', (tmp_path / 'p1.html').read_text())) == 5
+
+    tc.deposit(out / 'p1' / 'big.json.gz', suite.sel(plan='p1', Gauge='g1')[['Sim', 'Obs']].to_pandas(), pyramid=8)
+    assert sorted(f.name for f in (out / 'p1' / '_big').iterdir())[0] == '1_0.json.gz'
+    assert len(tc.zoomDF(out / 'p1' / 'big.json.gz', maxpoints=40)) == 40
+    with pytest.raises(ValueError):
+        tc.deposit(tmp_path / 'bin.json.gz', suite.sel(plan='p1', Gauge='g1')[['Sim']].to_pandas(), binary='float32')
+
+
+def test_compactX(tcdf, tmp_path):
+    tcdf = tcdf[['Sim', 'Obs']]
+    jsn = tc.deposit(tmp_path / 'tc.json', tcdf, compactX=True)
+    assert jsn['x'] == {'start': '2000-01-01 00:00:00', 'step': 3600000, 'count': len(tcdf), 'unit': 'ms'}
+    pd.testing.assert_frame_equal(tc.toDF(tmp_path / 'tc.json'), tcdf, check_freq=False, check_names=False,
+        check_index_type=False)
+    tc.deposit(tmp_path / 'plain.json', tcdf)
+    assert tc.plot(tmp_path / 'tc.json').data[0].x == tc.plot(tmp_path / 'plain.json').data[0].x
+    assert (tmp_path / 'tc.json').stat().st_size < (tmp_path / 'plain.json').stat().st_size - 15 * len(tcdf)
+
+    # a gap splits it into runs, appending rewrites it still compact
+    tc.append(tmp_path / 'tc.json', tcdf.iloc[:20].shift(100, freq='h'))
+    x = json.loads((tmp_path / 'tc.json').read_text())['x']
+    assert [run['count'] for run in x['runs']] == [len(tcdf), 20]
+    assert len(tc.toDF(tmp_path / 'tc.json')) == len(tcdf) + 20
+
+    irregular = tcdf.iloc[np.r_[0:5, 7, 11, 12, 20:22]]
+    assert isinstance(tc.deposit(None, irregular, compactX=True)['x'], list)
+    ints = tc.deposit(tmp_path / 'ints.json', tcdf.reset_index(drop=True), compactX=True, binary='float64')
+    assert ints['x'] == {'start': 0, 'step': 1, 'count': len(tcdf)}
+    assert list(tc.toDF(tmp_path / 'ints.json').index) == list(range(len(tcdf)))
+
+
+def test_compactX_sharedX(suite, tmp_path):
+    tc.depositDSsuite(suite, tmp_path, sharedX=True, compactX=True, catalog=True)
+    assert json.loads((tmp_path / 'p1' / '_x.json').read_text())['x']['count'] == 40
+    expected = suite.sel(plan='p1', Gauge='g1')[['Sim', 'Obs']].to_pandas()[['Sim', 'Obs']]
+    df = tc.toDF(tmp_path / 'p1' / 'ts_g1.json')
+    assert df.index.equals(expected.index) and np.allclose(df.values, expected.values)
+    row = tc.queryCatalog(tmp_path).iloc[0]
+    assert (row['x0'], row['x1'], row['points']) == ('2000-01-01 00:00:00', '2000-01-02 15:00:00', 40)
+
+
+def test_CapsuleServer_query(suite, tmp_path):
+    tc.depositDSsuite(suite, tmp_path, compactX=True)
+    server = tc.CapsuleServer(tmp_path)
+    status, _, body = server.query('/')
+    assert status == 200 and json.loads(body)[:2] == ['p1/ts_g0', 'p1/ts_g1']
+    assert server.query('/p2')[0] == 200 and len(json.loads(server.query('/p2')[2])) == 5
+
+    status, headers, body = server.query('/p1/g1?traces=Obs&x0=2000-01-01%2010:00:00&x1=2000-01-02&maxpoints=6')
+    assert status == 200
+    jsn = json.loads(body)
+    assert [trace['name'] for trace in jsn['data']] == ['Obs'] and jsn['data'][0]['line'] == {'width': 1}
+    assert jsn['downsample']['originalLength'] == 15 and len(jsn['x']) <= 6
+    full = tc.toDF(tmp_path / 'p1' / 'ts_g1.json')
+    df = tc.toDF(jsn)
+    assert df.index[0] == pd.Timestamp('2000-01-01 10:00') and np.allclose(df['Obs'], full['Obs'].loc[df.index])
+
+    jsn = json.loads(server.query('/p1/ts_g1.json?x1=2000-01-01%2003:00:00')[2])
+    assert jsn['x'] == {'start': '2000-01-01 00:00:00', 'step': 3600000, 'count': 4, 'unit': 'ms'}
+
+    # etags revalidate, gzip is its own variant
+    assert server.query('/p1/g1', {'if-none-match': headers['ETag']})[0] == 200
+    _, headers, _ = server.query('/p1/g1')
+    assert server.query('/p1/g1', {'if-none-match': headers['ETag']})[0] == 304
+    status, gzheaders, body = server.query('/p1/g1', {'accept-encoding': 'gzip, br'})
+    assert gzheaders['Content-Encoding'] == 'gzip' and gzheaders['ETag'] != headers['ETag']
+    assert json.loads(gzip.decompress(body)) == json.loads(server.query('/p1/g1')[2])
+    assert len(server.capsules) == 1
+
+    tc.deposit(tmp_path / 'p1' / 'ts_g1.json', full.iloc[:5])
+    os.utime(tmp_path / 'p1' / 'ts_g1.json', ns=(1, 1))
+    assert server.query('/p1/g1', {'if-none-match': headers['ETag']})[0] == 200
+    assert len(json.loads(server.query('/p1/g1')[2])['data'][0]['y']) == 5
+
+    assert server.query('/p1/nope')[0] == 404 and server.query('/../etc/passwd')[0] == 404
+    assert server.query('/p1/g1?traces=Nope')[0] == 400 and server.query('/p1/g1?maxpoints=x')[0] == 400
+    for query in ['x0=garbage', 'x1=2000-13-45', 'maxpoints=-3', 'maxpoints=0']:
+        status, _, body = server.query(f'/p1/g1?{query}')
+        assert status == 400 and 'error' in json.loads(body)
+
+    tc.deposit(tmp_path / 'p1' / 'ts_zoom.json', full, pyramid=4)
+    jsn = json.loads(server.query('/p1/zoom?x0=2000-01-01%2010:00:00&x1=2000-01-01%2012:00:00')[2])
+    assert tc.toDF(jsn).index[0] == pd.Timestamp('2000-01-01 10:00') and len(jsn['data'][0]['y']) == 3
+    assert server.query('/p1/zoom?x0=garbage')[0] == 400
+
+
+def test_CapsuleServer_http(suite, tmp_path, caplog):
+    tc.depositDSsuite(suite, tmp_path)
+    server = tc.CapsuleServer(tmp_path)
+    query = server.query
+    def failing(target, headers={}):
+        if target == '/boom':
+            raise RuntimeError('boom')
+        return query(target, headers)
+    server.query = failing
+
+    async def roundtrip():
+        srv = await server.start('127.0.0.1', 0)
+        port = srv.sockets[0].getsockname()[1]
+        reader, writer = await asyncio.open_connection('127.0.0.1', port)
+        responses = []
+        for target, connection in [('/p2/g3?maxpoints=10', 'keep-alive'), ('/boom', 'keep-alive'),
+                                   ('/p2/missing', 'close')]:
+            writer.write(f'GET {target} HTTP/1.1\r\nHost: localhost\r\nConnection: {connection}\r\n\r\n'.encode())
+            await writer.drain()
+            status = (await reader.readline()).split()[1]
+            headers = {}
+            while (line := (await reader.readline()).strip()):
+                key, _, val = line.decode().partition(':')
+                headers[key.lower()] = val.strip()
+            responses += [(int(status), json.loads(await reader.readexactly(int(headers['content-length']))))]
+        assert await reader.read() == b''
+        writer.close()
+        srv.close()
+        await srv.wait_closed()
+        return responses
+
+    with caplog.at_level('ERROR', logger='timecapsule'):
+        (ok, jsn), (failed, _), (missing, _) = asyncio.run(roundtrip())
+    assert ok == 200 and failed == 500 and missing == 404
+    assert [(rec.message, rec.exc_info[0]) for rec in caplog.records] == [('Failed to answer /boom', RuntimeError)]
+    # each trace picks up to maxpoints rows, x holds their union
+    assert len(jsn['x']) <= 20 and [trace['name'] for trace in jsn['data']] == ['Sim', 'Obs']
+
+
+def test_Tracer(suite, tmp_path, caplog):
+    records = []
+    with caplog.at_level('INFO', logger='timecapsule'), tc.Tracer(callback=records.append) as tr:
+        tc.depositDSsuite(suite, tmp_path / 'suite', workers=2, executor='thread', downsample=10)
+        tc.toHTML(tmp_path / 'suite' / 'p1', tmp_path / 'p1.html', openHTML=False, fast=True)
+    tc.deposit(tmp_path / 'untraced.json', suite['Sim'].isel(plan=0, Gauge=0).to_pandas().to_frame())
+    assert any(rec.message.startswith('Bounced to') for rec in caplog.records)
+
+    recs = tr.records()
+    assert len(recs) == len(records) and 'untraced.json' not in ' '.join(recs['capsule'].dropna())
+    summ = tr.summary()
+    assert {'compute', 'slice', 'downsample', 'x', 'scrub', 'serialize', 'write', 'figure', 'to_html', 'report'} <= set(summ.index)
+    assert summ.loc['write', 'calls'] == 10
+    written = sum(f.stat().st_size for f in (tmp_path / 'suite').rglob('ts_*.json'))
+    assert summ.loc['write', 'bytes'] == written
+    assert summ.loc['report', 'bytes'] == (tmp_path / 'p1.html').stat().st_size
+    jsn = json.loads(tr.toJSON(tmp_path / 'trace.json'))
+    assert len(jsn['records']) == len(recs) and json.loads((tmp_path / 'trace.json').read_text()) == jsn
@@ -1,5 +1,10 @@
-import json
+import sys, json, time, os, re, io, gzip, logging, traceback, hashlib, threading, tempfile, shutil, mmap, sqlite3
+from contextlib import closing, contextmanager, ExitStack
 from pathlib import Path
+from collections import deque, OrderedDict
+from itertools import islice, chain, product
+from functools import lru_cache, reduce
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
 import pandas as pd, numpy as np
 from pandas.api.types import is_datetime64_any_dtype as is_datetime
 from copy import deepcopy
@@ -33,10 +38,419 @@ def nan2None(obj):
     elif isinstance(obj, float) and np.isnan(obj):
         return None
     return obj
-class NanConverter(json.JSONEncoder):
+def _numericArray(values):
+    '''values as a numpy float/int/bool array, None if they aren't one'''
+    arr = values
+    if isinstance(values,(pd.Series,pd.Index)) and isinstance(values.dtype,np.dtype):
+        arr = values.to_numpy()
+    if isinstance(arr,np.ndarray) and arr.dtype.kind in 'fiub':
+        return arr
+    return None
+def nanmask2None(values):
+    '''vectorized nan2None for a 1D array-like, returns a list\n
+    float arrays are masked with np.isnan in 1 pass and converted with .tolist(),
+    so NaN becomes None without recursing over every element in python\n
+    other dtypes (object, strings, datetimes, pandas extension types) fall back to nan2None'''
+    arr = _numericArray(values)
+    if arr is None:
+        return nan2None(values.to_list() if hasattr(values,'to_list') else list(values))
+    lst = arr.tolist()
+    if arr.dtype.kind == 'f':
+        for i in np.flatnonzero(np.isnan(arr)):
+            lst[i] = None
+    return lst
+class _LRU:
+    '''minimal thread safe LRU cache\n
+    evicts least recently used entries once the summed sizeof(val) of all entries passes maxsize'''
+    def __init__(self,maxsize,sizeof=lambda val: 1):
+        self.maxsize = maxsize
+        self.sizeof = sizeof
+        self.size = 0
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+    def get(self,key,default=None):
+        with self._lock:
+            if key not in self._cache:
+                return default
+            self._cache.move_to_end(key)
+            return self._cache[key][0]
+    def __setitem__(self,key,val):
+        # sizes are kept with the entries, so sizeof runs once per entry
+        size = self.sizeof(val)
+        with self._lock:
+            if key in self._cache:
+                self.size -= self._cache.pop(key)[1]
+            if size > self.maxsize:
+                return
+            self._cache[key] = (val,size)
+            self.size += size
+            while self.size > self.maxsize:
+                _,(_,old) = self._cache.popitem(last=False)
+                self.size -= old
+    def __contains__(self,key):
+        return key in self._cache
+    def __len__(self):
+        return len(self._cache)
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
+            self.size = 0
+
+# progress goes to the 'timecapsule' logger, silent unless logging is configured, eg
+#   logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger('timecapsule')
+
+# active Tracers, see _stage
+_tracers = []
+
+class Tracer:
+    '''records how long each stage of depositing and rendering takes while active, with byte and point
+    counts where there are some, per capsule:\n
+        with Tracer() as tr:
+            depositDSsuite(ds,outsuitepth,outHTMLdir=outHTMLdir)
+        tr.summary()\n
+    stages: compute (a dataset block), slice (its capsules' frames), downsample, x (formatting x),
+    scrub (NaN to null), serialize, write, figure (plot/plotSpec), to_html (a plot's div), report (a whole toHTML)\n
+    callback: func called with each record dict as it comes in, eg to stream them elsewhere\n
+    only stages run in this process are seen, so with workers use executor='thread' to trace the
+    per capsule stages too'''
+    def __init__(self,callback=None):
+        self.callback = callback
+        self._records = []
+        self._lock = threading.Lock()
+    def __enter__(self):
+        _tracers.append(self)
+        return self
+    def __exit__(self,*exc):
+        _tracers.remove(self)
+    def record(self,stage,seconds,capsule=None,**counts):
+        rec = {'stage':stage,'seconds':seconds,'capsule':None if capsule is None else str(capsule),**counts}
+        with self._lock:
+            self._records.append(rec)
+        if self.callback:
+            self.callback(rec)
+    def records(self) -> pd.DataFrame:
+        '''every record, in the order they came in'''
+        with self._lock:
+            recs = list(self._records)
+        return pd.DataFrame(recs,columns=list(dict.fromkeys(
+            ['stage','seconds','capsule','bytes','points',*(key for rec in recs for key in rec)])))
+    def summary(self) -> pd.DataFrame:
+        '''per stage: calls, total/mean/max seconds, and total bytes and points, slowest stage first'''
+        recs = self.records()
+        summ = recs.groupby('stage').agg(calls=('seconds','size'),seconds=('seconds','sum'),
+            mean=('seconds','mean'),max=('seconds','max'),
+            bytes=('bytes',lambda b: b.sum(min_count=1)),points=('points',lambda p: p.sum(min_count=1)))
+        return summ.sort_values('seconds',ascending=False)
+    def toJSON(self,outJSON=None):
+        '''{'summary':{stage:{...}},'records':[...]} as a json string, also written to outJSON if given'''
+        recs, summ = self.records().astype(object), self.summary().astype(object)
+        jsn = json.dumps({'summary':summ.where(summ.notna(),None).to_dict('index'),
+            'records':recs.where(recs.notna(),None).to_dict('records')})
+        if outJSON:
+            Path(outJSON).write_text(jsn)
+        return jsn
+
+@contextmanager
+def _stage(stage,capsule=None,**counts):
+    '''time the block to every active Tracer, as stage of capsule; yields counts for the block
+    to fill in (eg counts['bytes']), and does nothing when no Tracer is active'''
+    if not _tracers:
+        yield counts
+        return
+    start = time.perf_counter()
+    try:
+        yield counts
+    finally:
+        seconds = time.perf_counter()-start
+        for tracer in list(_tracers):
+            tracer.record(stage,seconds,capsule,**counts)
+
+def _listBytes(lst):
+    '''rough bytes held by a list of python objects, eg formatted x strings'''
+    return sys.getsizeof(lst) + sum(map(sys.getsizeof,lst))
+
+# formatted x axes, keyed by a hash of the index, capped at maxsize bytes (each point is a python str, ~75 bytes)
+#   set xcache.maxsize = 0 to turn it off
+xcache = _LRU(maxsize=64*2**20,sizeof=_listBytes)
+
+def _indexKey(index):
+    '''hashable key for the values of a numeric/datetime index, None if it isn't worth hashing'''
+    vals = index.values if isinstance(index,pd.Index) else None
+    if not isinstance(vals,np.ndarray) or vals.dtype.kind not in 'fiubmM':
+        return None
+    digest = hashlib.blake2b(np.ascontiguousarray(vals).view(np.uint8)).hexdigest()
+    return (str(index.dtype),len(vals),digest)
+
+def _formatX(index):
+    '''tcdf.index => x list for the timecapsule, datetimes as '%Y-%m-%d %X' strings, NaN/NaT as None\n
+    cached in xcache, since every gauge in a trial shares the same index'''
+    key = _indexKey(index) if xcache.maxsize else None
+    if key is None:
+        return _formatXuncached(index)
+    X = xcache.get(key)
+    if X is None:
+        X = _formatXuncached(index)
+        xcache[key] = X
+    # copy so the cached list can't be mutated through a returned jsn
+    return list(X)
+
+# %X is locale dependent, only take the numpy shortcut when it's plain HH:MM:SS
+_isoX = time.strftime('%X',time.struct_time((2000,1,1,13,4,5,5,1,0))) == '13:04:05'
+def _formatXuncached(index):
+    if not is_datetime(index):
+        return nanmask2None(index)
+    if not _isoX:
+        return nanmask2None(index.strftime('%Y-%m-%d %X'))
+    # same as index.strftime('%Y-%m-%d %X') without the per-element strftime
+    if getattr(index,'tz',None) is not None:
+        index = index.tz_localize(None)
+    stamps = np.datetime_as_string(
+        index.values.astype('datetime64[s]'),unit='s').tolist()
+    X = [stamp.replace('T',' ') for stamp in stamps]
+    for i in np.flatnonzero(index.isna()):
+        X[i] = None
+    return X
+
+def _isCompactX(X):
+    '''True if X is a compact x ({'start','step','count'} or {'runs':[...]}), see _compactX'''
+    return isinstance(X,dict) and ('start' in X or 'runs' in X)
+def _xRuns(vals,maxruns):
+    '''greedy split of int64 vals into regular runs [(start,step,count)], None if that takes more than maxruns'''
+    n = len(vals)
+    diffs = np.diff(vals)
+    # diff positions where the step changes
+    changes = np.flatnonzero(diffs[1:] != diffs[:-1]) + 1
+    runs, i = [], 0
+    while i < n:
+        if len(runs) >= maxruns:
+            return None
+        if i == n-1:
+            runs += [(int(vals[i]),0,1)]
+            break
+        # the run carries on through the points up to the next step change after i
+        nxt = np.searchsorted(changes,i,side='right')
+        end = changes[nxt] if nxt < len(changes) else n-1
+        runs += [(int(vals[i]),int(diffs[i]),int(end-i+1))]
+        i = end+1
+    return runs
+def _compactX(index,minrun=8):
+    '''compact x for a regular datetime or integer index: {'start','step','count'}, or for a piecewise regular one
+    {'runs':[{'start','step','count'},...]} as long as the runs average at least minrun points; None otherwise\n
+    datetimes are taken at the seconds written by _formatX, with start as its '%Y-%m-%d %X' string and
+    step in milliseconds ('unit':'ms'), so the x a viewer rebuilds is start + i*step'''
+    if len(index) == 0:
+        return None
+    if is_datetime(index):
+        if getattr(index,'tz',None) is not None:
+            index = index.tz_localize(None)
+        if index.hasnans:
+            return None
+        vals = index.values.astype('datetime64[s]').astype(np.int64)*1000
+    elif np.asarray(index).dtype.kind in 'iu':
+        vals = np.asarray(index).astype(np.int64)
+    else:
+        return None
+    runs = _xRuns(vals,max(1,len(vals)//minrun))
+    if runs is None:
+        return None
+    unit = {'unit':'ms'} if is_datetime(index) else {}
+    if unit:
+        starts = _formatXuncached(pd.DatetimeIndex(np.array([run[0] for run in runs],dtype='datetime64[ms]')))
+        runs = [(start,step,count) for start,(_,step,count) in zip(starts,runs)]
+    runs = [{'start':start,'step':step,'count':count} for start,step,count in runs]
+    return {**runs[0],**unit} if len(runs) == 1 else {'runs':runs,**unit}
+def _expandX(X):
+    '''compact x => pd.Index, DatetimeIndex for 'unit':'ms'; see _compactX'''
+    runs = X.get('runs',[X])
+    if X.get('unit') == 'ms':
+        vals = [np.datetime64(run['start'].replace(' ','T'),'ms') + np.arange(run['count'])*np.timedelta64(run['step'],'ms')
+            for run in runs]
+        return pd.DatetimeIndex(np.concatenate(vals).astype('datetime64[ns]') if vals else [])
+    return pd.Index(np.concatenate([run['start'] + np.arange(run['count'],dtype=np.int64)*run['step'] for run in runs]))
+class _NullEncoder(json.JSONEncoder):
+    '''unserializable objs (pd.NA, Timestamps etc) are written as null\n
+    leaves encode() alone so json.dumps can use the C encoder'''
     def default(self, obj):
         # possible other customizations here 
         pass
+try:
+    import orjson
+except ImportError:
+    orjson = None
+# stdlib by default, so capsules stay byte for byte the same whether or not orjson is installed
+_JSONbackend = 'json'
+def setJSONbackend(backend='json'):
+    '''json backend used to write capsules: 'json' (stdlib), 'orjson', or 'auto' for orjson if it's installed\n
+    both write the same capsule values, but orjson writes x/y arrays compactly
+    and may pick a different (equivalent) float notation, so only 'json' output is byte for byte stable;
+    the backend reads capsules too, orjson handing anything with an int too wide for it to stdlib'''
+    global _JSONbackend
+    if backend == 'auto':
+        backend = 'orjson' if orjson else 'json'
+    assert backend in ('orjson','json'), f"backend must be 'orjson', 'json' or 'auto', not {backend}"
+    if backend == 'orjson' and orjson is None:
+        raise ImportError('orjson is not installed')
+    _JSONbackend = backend
+def getJSONbackend():
+    return _JSONbackend
+
+def _orjsonArrayBody(values):
+    '''orjson version of _jsonArrayBody, None if orjson wouldn't write the same values as stdlib'''
+    try:
+        if isinstance(values,np.ndarray):
+            if values.dtype.kind == 'f':
+                # stdlib writes inf as Infinity, orjson as null
+                if np.isinf(values).any():
+                    return None
+                # float32 would be written at float32 precision, not as the float64 stdlib sees
+                values = values.astype(np.float64,copy=False)
+            out = orjson.dumps(np.ascontiguousarray(values),option=orjson.OPT_SERIALIZE_NUMPY)
+        else:
+            out = orjson.dumps(values,default=_null,option=orjson.OPT_SERIALIZE_NUMPY)
+            # null might have been an inf
+            if b'null' in out:
+                return None
+    except orjson.JSONEncodeError:
+        return None
+    # stdlib escapes non ascii, keep the file ascii too
+    if not out.isascii():
+        return None
+    return out[1:-1].decode()
+def _null(obj):
+    return None
+
+def _jsonArrayBody(values):
+    '''the inside of the json array for values, without the brackets\n
+    values: already NaN scrubbed list, or a numeric np array (NaN is written as null)'''
+    if _JSONbackend == 'orjson':
+        body = _orjsonArrayBody(values)
+        if body is not None:
+            return body
+    if isinstance(values,np.ndarray):
+        values = nanmask2None(values)
+    return json.dumps(values,cls=_NullEncoder)[1:-1]
+
+# runs of digits orjson might read as a float, being past 64 bits (or a long mantissa, which is harmless to reparse)
+_longDigits = re.compile(rb'\d{19}')
+def _loads(s):
+    '''parse capsule json str/bytes with the current backend'''
+    if _JSONbackend == 'orjson' and not _longDigits.search(s.encode() if isinstance(s,str) else s):
+        try:
+            return orjson.loads(s)
+        except orjson.JSONDecodeError:
+            # eg Infinity/NaN, which orjson doesn't read
+            pass
+    return json.loads(s)
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+# precompressed capsules, the codec is picked by the suffix after .json, eg ts_name.json.gz
+_codecs = {'.gz':'gzip','.br':'br','.zst':'zst'}
+_codecSuffix = {codec:suffix for suffix,codec in _codecs.items()}
+def _codec(pth):
+    '''compression codec of capsule path pth by its suffix, None if it's plain json'''
+    codec = _codecs.get(Path(pth).suffix)
+    if codec == 'br' and brotli is None:
+        raise ImportError(f'{Path(pth).name} is brotli compressed, which needs the brotli package')
+    if codec == 'zst' and zstandard is None:
+        raise ImportError(f'{Path(pth).name} is zstd compressed, which needs the zstandard package')
+    return codec
+def _capsuleStem(pth):
+    '''name of capsule path pth without its .json and compression suffixes'''
+    name = Path(pth).name
+    if Path(name).suffix in _codecs:
+        name = name[:-len(Path(name).suffix)]
+    return name[:-len('.json')] if name.endswith('.json') else Path(name).stem
+def _isCapsule(pth):
+    '''True for a capsule file (.json, or .json.gz/.br/.zst), False for sidecars (_name) and anything else'''
+    name = Path(pth).name
+    return not name.startswith(('_','.')) and (name.endswith('.json') or
+        any(name.endswith('.json'+suffix) for suffix in _codecs))
+
+class _BrotliWriter(io.RawIOBase):
+    '''binary file f wrapper which brotli compresses what's written to it'''
+    def __init__(self,f):
+        self.f, self.compressor = f, brotli.Compressor()
+    def writable(self):
+        return True
+    def write(self,b):
+        self.f.write(self.compressor.process(bytes(b)))
+        return len(b)
+    def close(self):
+        if not self.closed:
+            self.f.write(self.compressor.finish())
+            self.f.close()
+        super().close()
+class _BrotliReader(io.RawIOBase):
+    '''binary file f wrapper which brotli decompresses as it's read'''
+    def __init__(self,f):
+        self.f, self.decompressor, self.pending = f, brotli.Decompressor(), b''
+    def readable(self):
+        return True
+    def readinto(self,b):
+        while not self.pending:
+            chunk = self.f.read(1<<16)
+            if not chunk:
+                return 0
+            self.pending = self.decompressor.process(chunk)
+        n = min(len(b),len(self.pending))
+        b[:n], self.pending = self.pending[:n], self.pending[n:]
+        return n
+    def close(self):
+        if not self.closed:
+            self.f.close()
+        super().close()
+
+def _openOut(pth,mode='w',codec=None):
+    '''open capsule path pth for writing, text ('w') or binary ('wb'),
+    compressed by its suffix (or codec), so writers stream straight into the compressor\n
+    gzip is written without a timestamp, so identical capsules are identical files'''
+    codec = codec or _codec(pth)
+    if codec is None:
+        return open(pth,mode)
+    if codec == 'gzip':
+        raw = gzip.GzipFile(pth,'wb',compresslevel=6,mtime=0)
+    elif codec == 'br':
+        raw = io.BufferedWriter(_BrotliWriter(open(pth,'wb')))
+    else:
+        raw = zstandard.ZstdCompressor().stream_writer(open(pth,'wb'))
+    return raw if 'b' in mode else io.TextIOWrapper(raw)
+def _openIn(pth):
+    '''open capsule path pth as a binary stream, decompressed by its suffix'''
+    codec = _codec(pth)
+    if codec is None:
+        return open(pth,'rb')
+    if codec == 'gzip':
+        return gzip.open(pth,'rb')
+    if codec == 'br':
+        return io.BufferedReader(_BrotliReader(open(pth,'rb')))
+    return zstandard.ZstdDecompressor().stream_reader(open(pth,'rb'),closefd=True)
+def _readBytes(pth):
+    '''contents of capsule path pth, decompressed'''
+    with _openIn(pth) as f:
+        return f.read()
+@contextmanager
+def _mapped(pth):
+    '''read only mmap of capsule path pth\n
+    compressed capsules are stream decompressed into a temp file first, so they're never inflated in memory'''
+    if _codec(pth) is None:
+        with open(pth,'rb') as f, mmap.mmap(f.fileno(),0,access=mmap.ACCESS_READ) as buf:
+            yield buf
+    else:
+        with _openIn(pth) as src, tempfile.TemporaryFile() as f:
+            shutil.copyfileobj(src,f,1<<20)
+            f.flush()
+            with mmap.mmap(f.fileno(),0,access=mmap.ACCESS_READ) as buf:
+                yield buf
+
+class NanConverter(_NullEncoder):
     def encode(self, obj, *args, **kwargs):
         obj = nan2None(obj)
         return super().encode(obj, *args, **kwargs)
@@ -45,7 +459,8 @@ class NanConverter(json.JSONEncoder):
         return super().iterencode(obj, *args, **kwargs)
     
 def deposit(outJSON,tcdf,attrz=None,layout={},data={},
-                    xtitle=None,ytitle=None,JSONindent=None):
+                    xtitle=None,ytitle=None,JSONindent=None,X=None,xref=None,binary=None,
+                    downsample=None,downsampler='lttb',pyramid=None,compactX=False):
     '''bounce outJSON timecapsule with specified data according to the timecapsule specification\n
     tcdf.index is the unified X axis, with xtitle as tcdf.index.name\n
     ytitle is the title of the y axis\n
@@ -55,9 +470,25 @@ def deposit(outJSON,tcdf,attrz=None,layout={},data={},
     https://plotly.com/javascript/reference/layout/\n\n
 
     data adds values to data for each trace, OR you may also pass in funcs for dict values as desired and it will compute the function on df[col] for each\n
+    X: precomputed x list for tcdf.index, to skip formatting it again when many capsules share 1 index\n
+    xref: path of a shared x sidecar json ({'x':[...]}) relative to outJSON, 
+    written in place of 'x' (see writeXsidecar), tcdf.index is then not formatted at all\n
+    binary: 'float64' or 'float32' to write a binary capsule instead: outJSON is then a small json header
+    (layout, attrz, trace names, dtype/offset of each array) and x plus the numeric y columns go to a
+    little endian buffer next to it, outJSON.with_suffix('.bin'); see _writeBinaryTC\n
+    downsample: target number of points per trace, longer tcdfs are decimated with downsampler
+    ('lttb' or 'minmax', see downsampleIndex) before writing, and the capsule records
+    'downsample':{'method','points','originalLength'}; attrz and data funcs still see the full tcdf\n
+    pyramid: tile size in points, to write outJSON as an overview downsampled to pyramid points, plus
+    a level of detail pyramid of tiles in the sidecar dir _<capsule name> next to outJSON, listed under 'pyramid' in outJSON;
+    see _depositPyramid, and zoomDF/plot(xrange=) to read back only the tiles covering a zoom window\n
+    outJSON ending in .json.gz, .json.br or .json.zst is written compressed (gzip, brotli or zstd),
+    streamed through the compressor; every reader here decompresses capsules by the same suffix\n
+    compactX: write a regular (or piecewise regular) datetime/integer x as {'start','step','count'}
+    (or {'runs':[...]}) instead of listing every x, see _compactX; irregular x is still listed\n
 
         jsn = {
-        'x':X,
+        **({'xref':str(xref)} if xref is not None else {'x':X}),
         'data':[
             {'name':col,
             'y':df[col].to_list(),
@@ -71,15 +502,242 @@ def deposit(outJSON,tcdf,attrz=None,layout={},data={},
     returns jsn
     '''
     #TODO if series col = 0
-    df = pd.DataFrame(tcdf)
-    if is_datetime(df.index):
-        X = df.index.strftime('%Y-%m-%d %X').to_list()
-    else:
-        X = df.index.to_list()
+    df = full = pd.DataFrame(tcdf)
+    manifest = None
+    if pyramid:
+        if xref is not None or outJSON is None:
+            raise ValueError('a pyramid writes its own x per tile to files, it needs an outJSON and no xref')
+        manifest = _depositPyramid(outJSON,df,pyramid,X=X,downsampler=downsampler,
+            layout=layout,data=data,xtitle=xtitle,ytitle=ytitle,JSONindent=JSONindent,binary=binary,compactX=compactX)
+        downsample = pyramid
+    downsampled = None
+    if downsample and len(df) > downsample:
+        if xref is not None:
+            raise ValueError("downsample picks its own x rows, it can't share an xref")
+        with _stage('downsample',outJSON,points=df.size):
+            rows = downsampleIndex(df,downsample,downsampler)
+        downsampled = {'method':downsampler,'points':int(downsample),'originalLength':len(df)}
+        df = df.iloc[rows]
+        if X is not None:
+            X = [X[i] for i in rows]
     # because NaNs screw up json, this is dealt with in the cls,
     #  but passing the dict obj to an api will need this handled first
-    X = nan2None(X) 
+    with _stage('x',outJSON,points=len(df)):
+        if xref is None and compactX:
+            X = _compactX(df.index) or X
+        if xref is None and X is None:
+            X = _formatX(df.index)
         
+    lyt = _capsuleLayout(layout,df,ytitle)
+    # numeric columns are kept as arrays for the serializer too
+    yarrays = {col:_numericArray(df[col]) for col in df.columns}
+    
+    with _stage('scrub',outJSON,points=df.size):
+        jsn = {
+            **({'xref':str(xref)} if xref is not None else {'x':X}),
+            'data':[
+                {'name':col,
+                'y':nanmask2None( yarrays[col] if yarrays[col] is not None else df[col] ),
+                **{key:val if not hasattr(val,'__call__') else val(full[col])
+                     for key,val in data.items() }
+                 
+                } for col in df.columns
+            ],
+            'layout':lyt
+        }
+    if downsampled:
+        jsn['downsample'] = downsampled
+    if manifest:
+        jsn['pyramid'] = manifest
+    
+    if attrz:
+        attrs = attrz(full) if callable(attrz) else attrz
+        # demo
+        # if 'oops' in attrs.keys():
+        #     attrs.pop('oops')
+        jsn.update({'attrz':attrs})
+
+    if outJSON and binary:
+        if _codec(outJSON):
+            raise ValueError(f"binary capsules aren't compressed, {Path(outJSON).name} should end in .json")
+        with _stage('write',outJSON,points=df.size):
+            _writeBinaryTC(outJSON,jsn,df.index,[yarrays[col] for col in df.columns],
+                dtype=binary,indent=JSONindent)
+    elif outJSON:
+        with _stage('serialize',outJSON,points=df.size) as counts:
+            text = _dumps(jsn,indent=JSONindent,yarrays=[yarrays[col] for col in df.columns])
+            counts['bytes'] = len(text)
+        with _stage('write',outJSON,bytes=len(text)):
+            with _openOut(outJSON) as outfile:
+                outfile.write(text)
+    
+    return jsn
+
+def _depositPyramid(outJSON,df,tilepoints,X=None,downsampler='lttb',**depositkw):
+    '''deposit the level of detail tiles of outJSON's pyramid, returns its manifest\n
+    level L splits df into 2**L equal runs of rows, each deposited as a capsule downsampled to tilepoints,
+    until the tiles fit in tilepoints and the finest level holds the raw rows\n
+    tiles go in outJSON.parent/f'_{stem}' (a sidecar dir, cleared first) as f'{L}_{i}.json', compressed like outJSON\n
+    manifest: {'dir','tilepoints','levels':[{'level':L,'tiles':[{'file','x0','x1','rows'}]}]}, coarse to fine,
+    with x0/x1 the first/last x of each tile as written in the capsule'''
+    outJSON = Path(outJSON)
+    X = _formatX(df.index) if X is None else X
+    stem = _capsuleStem(outJSON)
+    ext = outJSON.name[len(stem):]
+    tiledir = outJSON.parent/f'_{stem}'
+    shutil.rmtree(tiledir,ignore_errors=True)
+    tiledir.mkdir(parents=True)
+    N = len(df)
+    levels = []
+    level, rows = 1, N
+    while rows > tilepoints:
+        edges = np.linspace(0,N,2**level+1).astype(np.int64)
+        tiles = []
+        for i,(a,b) in enumerate(zip(edges[:-1],edges[1:])):
+            if a == b:
+                continue
+            name = f'{level}_{i}{ext}'
+            deposit(tiledir/name,df.iloc[a:b],X=X[a:b],downsample=tilepoints,downsampler=downsampler,**depositkw)
+            tiles += [{'file':name,'x0':X[a],'x1':X[b-1],'rows':int(b-a)}]
+        levels += [{'level':level,'tiles':tiles}]
+        level, rows = level+1, int(np.diff(edges).max())
+    return {'dir':tiledir.name,'tilepoints':int(tilepoints),'levels':levels}
+
+def _writeBinaryTC(outJSON,jsn,index,yarrays,dtype='float64',indent=None):
+    '''write jsn as a binary capsule: a json header at outJSON, arrays in outJSON.with_suffix('.bin')\n
+    the header is jsn with 'buffer' (the .bin file name, relative to outJSON) up front, and each numeric
+    x/y array swapped for {'dtype','offset','count'} of its block in the buffer, so it can be read with
+    np.memmap or sliced out of an ArrayBuffer as a Float64Array/Float32Array (blocks are 8 byte aligned)\n
+    y columns are written as dtype with NaN for null, non-numeric columns stay inline in the header\n
+    a datetime x is written as float64 epoch milliseconds of the wall time, with 'unit':'ms' in its descriptor'''
+    outJSON = Path(outJSON)
+    bufpth = outJSON.with_suffix('.bin')
+    dtype = np.dtype(dtype).newbyteorder('<')
+    blocks = []
+    offset = 0
+    def block(arr,**desc):
+        nonlocal offset
+        arr = np.ascontiguousarray(arr,dtype=arr.dtype.newbyteorder('<'))
+        desc = {'dtype':arr.dtype.str,'offset':offset,'count':len(arr),**desc}
+        pad = -arr.nbytes % 8
+        blocks.append((arr,pad))
+        offset += arr.nbytes + pad
+        return desc
+
+    header = {'buffer':bufpth.name}
+    for key,val in jsn.items():
+        if key == 'x':
+            if _isCompactX(val):
+                header['x'] = val
+            elif is_datetime(index):
+                wall = index.tz_localize(None) if getattr(index,'tz',None) is not None else index
+                ms = wall.values.astype('datetime64[ms]').astype(np.int64).astype(np.float64)
+                ms[np.asarray(wall.isna())] = np.nan
+                header['x'] = block(ms,unit='ms')
+            elif _numericArray(index) is not None:
+                header['x'] = block(_numericArray(index).astype(np.float64))
+            else:
+                header['x'] = val
+        elif key == 'data':
+            header['data'] = [
+                {**trace,'y':block(arr.astype(dtype))} if arr is not None else trace
+                    for trace,arr in zip(val,yarrays) ]
+        else:
+            header[key] = val
+
+    with open(bufpth,'wb') as f:
+        for arr,pad in blocks:
+            f.write(arr.tobytes())
+            f.write(b'\0'*pad)
+    with open(outJSON, 'w') as outfile:
+        outfile.write(json.dumps(nan2None(header),cls=_NullEncoder,indent=indent))
+
+def _readBuffer(bufpth,desc):
+    '''the array a binary capsule descriptor points to in bufpth, memory mapped\n
+    datetime x (desc with 'unit') comes back as a DatetimeIndex'''
+    if desc['count']:
+        arr = np.memmap(bufpth,dtype=desc['dtype'],mode='r',offset=desc['offset'],shape=(desc['count'],))
+    else:
+        arr = np.empty(0,dtype=desc['dtype'])
+    if 'unit' in desc:
+        return pd.DatetimeIndex(pd.to_datetime(arr,unit=desc['unit']))
+    return arr
+
+def _xNumeric(index):
+    '''index as float64 for geometry (datetimes as ns), row positions if it isn't numeric'''
+    if is_datetime(index):
+        return np.asarray(index.asi8,dtype=np.float64)
+    arr = _numericArray(index)
+    return np.arange(len(index),dtype=np.float64) if arr is None else arr.astype(np.float64)
+
+def minmaxIndex(y,n):
+    '''indices of the min and max of y in each of n//2 equal buckets, so every peak and trough survives\n
+    NaN is ignored; an all NaN bucket keeps its first point, so gaps still show'''
+    y = np.asarray(y,dtype=np.float64)
+    N = len(y)
+    if N <= n:
+        return np.arange(N)
+    nb = max(n//2,1)
+    edges = np.linspace(0,N,nb+1).astype(np.int64)
+    bucket = np.repeat(np.arange(nb),np.diff(edges))
+    nan = np.isnan(y)
+    picks = []
+    for vals,extremeOf in ((np.where(nan,-np.inf,y),np.maximum),(np.where(nan,np.inf,y),np.minimum)):
+        extreme = extremeOf.reduceat(vals,edges[:-1])
+        # first position in each bucket that hits the bucket's extreme
+        cand = np.flatnonzero(vals == extreme[bucket])
+        _,first = np.unique(bucket[cand],return_index=True)
+        picks += [cand[first]]
+    return np.unique(np.concatenate(picks))
+
+def lttbIndex(x,y,n):
+    '''Largest-Triangle-Three-Buckets: indices of n points of (x,y) that keep its visual shape\n
+    the first and last points are always kept, each bucket in between keeps the point making the
+    largest triangle with the previous pick and the next bucket's mean, vectorized within each bucket\n
+    NaN points are only picked when a whole bucket is NaN, so gaps still show'''
+    x = np.asarray(x,dtype=np.float64)
+    y = np.asarray(y,dtype=np.float64)
+    N = len(y)
+    if N <= n or n < 3:
+        return np.arange(N) if N <= n else np.linspace(0,N-1,max(n,1)).astype(np.int64)
+    edges = np.linspace(1,N-1,n-1).astype(np.int64)
+    valid = ~(np.isnan(x) | np.isnan(y))
+    counts = np.add.reduceat(valid.astype(np.float64),edges[:-1])
+    with np.errstate(invalid='ignore',divide='ignore'):
+        meanx = np.add.reduceat(np.where(valid,x,0),edges[:-1])/counts
+        meany = np.add.reduceat(np.where(valid,y,0),edges[:-1])/counts
+    idx = np.empty(n,dtype=np.int64)
+    idx[0],idx[-1] = 0,N-1
+    a = 0
+    for i in range(n-2):
+        s,e = edges[i],edges[i+1]
+        cx,cy = (meanx[i+1],meany[i+1]) if i < n-3 else (x[-1],y[-1])
+        if np.isnan(cx) or np.isnan(cy):
+            cx,cy = x[a],y[a]
+        area = np.abs((x[a]-cx)*(y[s:e]-y[a]) - (x[a]-x[s:e])*(cy-y[a]))
+        pick = s + int(np.where(np.isnan(area),-1,area).argmax())
+        idx[i+1] = pick
+        if valid[pick]:
+            a = pick
+    return idx
+
+def downsampleIndex(df,n,method='lttb'):
+    '''sorted row positions of df to keep so each numeric column is decimated to ~n points with method
+    ('lttb' or 'minmax'); the capsule shares 1 x across traces, so this is the union of each column's picks'''
+    assert method in ('lttb','minmax'), f"method must be 'lttb' or 'minmax', not {method}"
+    df = pd.DataFrame(df)
+    if len(df) <= n:
+        return np.arange(len(df))
+    x = _xNumeric(df.index) if method == 'lttb' else None
+    picks = [
+        lttbIndex(x,arr,n) if method == 'lttb' else minmaxIndex(arr,n)
+            for arr in (_numericArray(df[col]) for col in df.columns) if arr is not None ]
+    if not picks:
+        return np.linspace(0,len(df)-1,n).astype(np.int64)
+    return np.unique(np.concatenate(picks))
+
+def _capsuleLayout(layout,df,ytitle=None):
+    '''layout for a capsule of df, with axis and legend titles filled in from df and ytitle'''
     lyt = deepcopy(layout)
 
     xtitle = df.index.name
@@ -99,36 +757,393 @@ def deposit(outJSON,tcdf,attrz=None,layout={},data={},
             'yaxis': {
                 'title':{'text':ytitle}}
         })
-    
-    jsn = {
-        'x':X,
-        'data':[
-            {'name':col,
-            'y':nan2None( df[col].to_list() ),
-            **{key:val if not hasattr(val,'__call__') else val(df[col])
-                 for key,val in data.items() }
-             
-            } for col in df.columns
-        ],
-        'layout':lyt
-    }
-    
-    if attrz:
-        attrs = attrz(df) if callable(attrz) else attrz
-        # demo
-        # if 'oops' in attrs.keys():
-        #     attrs.pop('oops')
-        jsn.update({'attrz':attrs})
+    return lyt
 
-    if outJSON:
-        with open(outJSON, 'w') as outfile:
-            json.dump(jsn , outfile,
-                    cls=NanConverter,
-                    indent=JSONindent
-                    )
-    
+def _traceParts(col,extras):
+    '''json text before and after the y values of a trace {"name":col,"y":[...],**extras}'''
+    trace = json.dumps(nan2None({'name':col,'y':[],**extras}),cls=_NullEncoder)
+    # name comes first and can't contain an unescaped '"y": []', so this is the top level y
+    head,_,tail = trace.partition('"y": []')
+    return head+'"y": [', ']'+tail
+
+def _columnValues(col):
+    '''col as a numeric np array if it is one, else a NaN scrubbed list, for _jsonArrayBody'''
+    arr = _numericArray(col)
+    return nanmask2None(col) if arr is None else arr
+
+class _ArrayWriter:
+    '''writes the comma separated body of 1 json array to f, chunk by chunk'''
+    def __init__(self,f):
+        self.f = f
+        self.empty = True
+    def write(self,values):
+        body = _jsonArrayBody(values)
+        if body:
+            self.f.write(body if self.empty else ', '+body)
+            self.empty = False
+
+def _chunked(df,chunksize):
+    return (df.iloc[i:i+chunksize] for i in range(0,len(df),chunksize))
+
+def depositStream(outJSON,source,attrz=None,layout={},data={},
+                    ytitle=None,xref=None,chunksize=100_000):
+    '''streaming deposit(): writes the capsule straight to outJSON without building the jsn dict,
+    formatting x and each y column chunksize rows at a time from numpy\n
+    source: DataFrame, or an iterable (eg generator) of DataFrame chunks sharing the first chunk's columns,
+    for series too long to hold in memory at once; the columns are spooled through temp files
+    so memory stays about 1 chunk regardless of length\n
+    attrz, layout, data, ytitle, xref: as in deposit,
+    but attrz and data funcs are only supported for a DataFrame source, since they need the whole df\n
+    writes the same bytes as deposit(outJSON,...) with JSONindent=None\n
+    returns outJSON'''
+    if isinstance(source,(pd.DataFrame,pd.Series)):
+        whole = first = pd.DataFrame(source)
+    else:
+        if callable(attrz) or any(callable(val) for val in data.values()):
+            raise TypeError('attrz and data funcs need a DataFrame source, not an iterable of chunks')
+        whole = None
+        chunks = iter(source)
+        first = pd.DataFrame(next(chunks))
+    cols = first.columns
+    lyt = _capsuleLayout(layout,first,ytitle)
+    traceParts = [
+        _traceParts(col,{key:val if not callable(val) else val(whole[col]) for key,val in data.items()})
+            for col in cols]
+    attrs = attrz(whole) if callable(attrz) else attrz
+    xkey = object() # a column could be named 'x'
+
+    if whole is None:
+        # rows arrive in chunks but the file is column major, so spool each column to a temp file
+        spools = {col:tempfile.TemporaryFile('w+') for col in ([] if xref is not None else [xkey])+list(cols)}
+        writers = {col:_ArrayWriter(f) for col,f in spools.items()}
+        for chunk in chain([first],chunks):
+            chunk = pd.DataFrame(chunk)[cols]
+            if xref is None:
+                writers[xkey].write(_formatXuncached(chunk.index))
+            for col in cols:
+                writers[col].write(_columnValues(chunk[col]))
+        def writeArray(outfile,col):
+            spools[col].seek(0)
+            shutil.copyfileobj(spools[col],outfile)
+            spools[col].close()
+    else:
+        # every column is already in memory, write each straight out chunk by chunk
+        def writeArray(outfile,col):
+            writer = _ArrayWriter(outfile)
+            for chunk in _chunked(whole,chunksize):
+                writer.write(_formatXuncached(chunk.index) if col is xkey else _columnValues(chunk[col]))
+
+    with _openOut(outJSON) as outfile:
+        if xref is None:
+            outfile.write('{"x": [')
+            writeArray(outfile,xkey)
+            outfile.write('], "data": [')
+        else:
+            outfile.write('{"xref": '+json.dumps(str(xref))+', "data": [')
+        for i,(col,(head,tail)) in enumerate(zip(cols,traceParts)):
+            outfile.write((', ' if i else '')+head)
+            writeArray(outfile,col)
+            outfile.write(tail)
+        outfile.write('], "layout": '+json.dumps(nan2None(lyt),cls=_NullEncoder))
+        if attrs:
+            outfile.write(', "attrz": '+json.dumps(nan2None(attrs),cls=_NullEncoder))
+        outfile.write('}')
+    return outJSON
+
+def _dumps(jsn,indent=None,yarrays=None):
+    '''serialize a deposit() jsn, with the stdlib backend identical to json.dump(jsn,cls=NanConverter)\n
+    x and each trace's y are already scrubbed by nanmask2None, so only the small
+    stuff (layout, attrz, data extras) gets the recursive nan2None\n
+    yarrays: numeric np arrays (or None) matching jsn['data'], which the orjson backend writes
+    instead of the y lists; stdlib writes the already scrubbed lists rather than converting the arrays again'''
+    scrubbed = {key:val if key=='x' else nan2None(val) 
+        for key,val in jsn.items() if key!='data'}
+    if 'data' in jsn:
+        scrubbed['data'] = [
+            {key:val if key=='y' else nan2None(val) for key,val in trace.items()}
+                for trace in jsn['data'] ]
+    # keep key order the same as jsn
+    scrubbed = {key:scrubbed[key] for key in jsn}
+    if indent is not None:
+        return json.dumps(scrubbed,cls=_NullEncoder,indent=indent)
+
+    # x/y arrays go through _jsonArrayBody (orjson if set), the rest through the stdlib C encoder
+    if not yarrays or _JSONbackend != 'orjson':
+        yarrays = [None]*len(scrubbed.get('data',[]))
+    parts = []
+    for key,val in scrubbed.items():
+        if key == 'x' and not _isCompactX(val):
+            body = '['+_jsonArrayBody(val)+']'
+        elif key == 'data' and all('y' in trace for trace in val):
+            traces = []
+            for trace,arr in zip(val,yarrays):
+                head,tail = _traceParts(trace.get('name'),
+                    {k:v for k,v in trace.items() if k not in ('name','y')})
+                traces.append(head+_jsonArrayBody(trace['y'] if arr is None else arr)+tail)
+            body = '['+', '.join(traces)+']'
+        else:
+            body = json.dumps(val,cls=_NullEncoder)
+        parts.append(json.dumps(key)+': '+body)
+    return '{'+', '.join(parts)+'}'
+
+class DepositError(Exception):
+    '''raised after a depositDS* run finishes if any capsules failed\n
+    failures: {tcjson:traceback str} for each capsule that failed'''
+    def __init__(self, failures):
+        self.failures = failures
+        super().__init__(
+            f'{len(failures)} capsule(s) failed to deposit:\n'+
+            '\n'.join(str(tcjson) for tcjson in failures))
+
+def _tryCall(func,args):
+    '''returns (result,None), or (None,traceback str) if func(*args) raises'''
+    try:
+        return func(*args), None
+    except Exception:
+        return None, traceback.format_exc()
+def _tryChunk(func,chunk):
+    return [_tryCall(func,args) for args in chunk]
+
+def _getExecutor(workers=None,executor='process'):
+    '''executor: 'process', 'thread', or a concurrent.futures.Executor instance\n
+    returns (executor instance or None if serial, whether we own it and need to shut it down)'''
+    if isinstance(executor,Executor):
+        return executor, False
+    if not workers:
+        return None, False
+    pools = {'process':ProcessPoolExecutor,'thread':ThreadPoolExecutor}
+    assert executor in pools, f"executor must be 'process', 'thread' or an Executor, not {executor}"
+    return pools[executor](max_workers=workers), True
+
+def _imapOrdered(func,tasks,executor=None,chunksize=8,window=None):
+    '''yields (result,traceback str or None) for func(*args) for each args in tasks, in order of tasks\n
+    tasks are submitted to executor chunksize at a time, with at most window chunks in flight
+    so a long generator of tasks isn't materialized all at once\n
+    executor None: run serially in this process'''
+    if executor is None:
+        for args in tasks:
+            yield _tryCall(func,args)
+        return
+    window = window or 2*(os.cpu_count() or 1)
+    tasks = iter(tasks)
+    inflight = deque()
+    def submitChunk():
+        chunk = list(islice(tasks,chunksize))
+        if chunk:
+            inflight.append(executor.submit(_tryChunk,func,chunk))
+        return bool(chunk)
+    while len(inflight)<window and submitChunk():
+        pass
+    while inflight:
+        results = inflight.popleft().result()
+        submitChunk()
+        yield from results
+
+def _imapBlocks(func,blocks,executor=None,chunksize=8):
+    '''_imapOrdered over blocks, each a list of args for func, yielding (result,traceback str or None) in order\n
+    every task of a block is submitted at once, then the next block is pulled (eg computed) while executor
+    works through them, and the previous block's results are all yielded before pulling any further one;
+    so at most 2 blocks of tasks are held at a time, however many workers there are'''
+    if executor is None:
+        for tasks in blocks:
+            for args in tasks:
+                yield _tryCall(func,args)
+        return
+    last = []
+    for tasks in blocks:
+        futures = [executor.submit(_tryChunk,func,tasks[i:i+chunksize]) for i in range(0,len(tasks),chunksize)]
+        for future in last:
+            yield from future.result()
+        last = futures
+    for future in last:
+        yield from future.result()
+
+def writeXsidecar(outJSON,X,compactX=False):
+    '''write a shared x axis sidecar, which capsules deposited with xref point to instead of carrying x\n
+    X: x list (as formatted by deposit) or a pd.Index\n
+    compactX: write a regular pd.Index X as a compact x, see deposit'''
+    compact = _compactX(X) if compactX and isinstance(X,pd.Index) else None
+    if isinstance(X,pd.Index):
+        X = _formatX(X)
+    with _openOut(outJSON) as outfile:
+        outfile.write('{"x": '+(json.dumps(compact) if compact else '['+_jsonArrayBody(X)+']')+'}')
+
+def _loadTC(tc):
+    '''timecapsule Path or dict => dict, never the caller's dict\n
+    a shared x sidecar ('xref') is resolved relative to the capsule's path, and a compact x is listed out'''
+    if isinstance(tc,dict):
+        return deepcopy(tc)
+    jsn = _loads(_readBytes(tc))
+    if 'buffer' in jsn:
+        # binary capsule, swap the descriptors for lists as if it were json
+        bufpth = Path(tc).parent/jsn.pop('buffer')
+        if isinstance(jsn.get('x'),dict) and not _isCompactX(jsn['x']):
+            X = _readBuffer(bufpth,jsn['x'])
+            jsn['x'] = _formatXuncached(X) if isinstance(X,pd.Index) else nanmask2None(X)
+        jsn['data'] = [{**trace,'y':nanmask2None(_readBuffer(bufpth,trace['y']))} 
+            if isinstance(trace.get('y'),dict) else trace 
+                for trace in jsn.get('data',[])]
+    if 'xref' in jsn and 'x' not in jsn:
+        X = _loads(_readBytes(Path(tc).parent/jsn['xref']))['x']
+        jsn = {'x':X,**{key:val for key,val in jsn.items() if key!='xref'}}
+    if _isCompactX(jsn.get('x')):
+        X = _expandX(jsn['x'])
+        jsn['x'] = _formatXuncached(X) if isinstance(X,pd.DatetimeIndex) else X.tolist()
     return jsn
 
+def _splitTemplate(template,filedims):
+    '''(dir pieces, name pieces) of a depositDataset pathTemplate, split at its last / outside of a {filedim};
+    pieces alternate literal text and filedims, starting and ending with literal text\n
+    only {filedim} for each of filedims is substituted, so dim names may hold . [ 0 etc, and any other braces
+    (eg in a literal file name) are left as they are'''
+    tokens = {'{'+str(dim)+'}':dim for dim in filedims}
+    pieces = [template]
+    if tokens:
+        pieces = re.split('('+'|'.join(map(re.escape,sorted(tokens,key=len,reverse=True)))+')',template)
+        pieces[1::2] = [tokens[token] for token in pieces[1::2]]
+    cut = next((i for i in range(len(pieces)-1,-1,-2) if '/' in pieces[i]),None)
+    if cut is None:
+        return [''], pieces
+    j = pieces[cut].rindex('/')
+    return pieces[:cut]+[pieces[cut][:j]], [pieces[cut][j+1:]]+pieces[cut+1:]
+
+def _fillTemplate(pieces,key):
+    '''pieces of _splitTemplate with each filedim replaced by str of its value in key'''
+    return ''.join(str(key[piece]) if i%2 else piece for i,piece in enumerate(pieces))
+
+def depositDataset(ds,outpth,
+            xdim='Time (UTC)',
+            filedims=(),
+            tracedim=None,
+            pathTemplate=None,
+            ytitle=None,
+            outHTMLdir=None,
+            htmlsuffstr='',
+            workers=None,
+            executor='process',
+            chunksize=8,
+            sharedX=False,
+            downsample=None,
+            downsampler='lttb',
+            incremental=False,
+            catalog=False,
+            attrz=None,
+            bounds=None,
+            compress=None,
+            compactX=False,
+            memory=2**30,
+        ):
+    '''bounce a capsule for every combination of ds's filedims, with xdim as x and a trace per data var
+    (per data var and tracedim value if tracedim, named by the value, or f'{var} {value}' with more than 1 var);
+    vars missing some of those dims are broadcast across them, any other dim is a ValueError\n
+    pathTemplate: capsule path relative to outpth, with each {filedim} replaced by that filedim's value
+    (the rest is literal, see _splitTemplate), default f'{filedims[0]}/.../ts_{filedims[-1]}.json', eg '{plan}/ts_{Gauge}.json';
+    the dirs its part before the last / names are the capsule dirs, which each get their own _x.json, manifest and report\n
+    outHTMLdir: if given, bounce a report of each capsule dir there as f'{dir}{htmlsuffstr}.html'
+    (outpth's name for outpth itself, _ for /), or a func of the capsule dir (relative to outpth) returning its report path\n
+    workers: number of processes/threads to fan the capsule deposits across, None to run serially\n
+    executor: 'process', 'thread', or a concurrent.futures.Executor to reuse\n
+    chunksize: capsules per submitted task\n
+    sharedX: write xdim once per capsule dir to a _x.json sidecar, which each capsule references by xref\n
+    downsample, downsampler: decimate each capsule, see deposit; each keeps its own x rows so this can't be sharedX\n
+    incremental: keep a _manifest.json in each capsule dir with a hash of every capsule's data and deposit params,
+    and only re-deposit the capsules (and rebuild the reports, see toHTML) whose hash changed since the last run\n
+    catalog: index the capsules into outpth/_catalog.sqlite, see updateCatalog/queryCatalog\n
+    attrz: func of a capsule's {filedim: value} returning its attrz (or None)\n
+    bounds: the reports' attrz bounds, see toHTML\n
+    compress: 'gzip', 'br' or 'zst' to write every capsule (and _x.json) compressed, with .gz/.br/.zst after .json, see deposit\n
+    compactX: write regular x axes (in each capsule, or the _x.json) as {'start','step','count'}, see deposit\n
+    memory: bytes of ds values to hold at once, None for no cap; ds (eg dask backed, from NetCDF/Zarr) is computed
+    in blocks that follow its chunks (see _fileBlocks), so each chunk is computed once and written out for every
+    capsule it covers; blocks are kept to half of memory, since with workers the next one is computed while the
+    last one's capsules are still being written (and no further, see _imapBlocks), and a chunk that won't fit
+    is split (and computed again per piece)\n
+    a failing capsule doesn't stop the rest, all failures are raised together in a DepositError at the end'''
+    outpth = Path(outpth)
+    filedims = list(filedims)
+    for dim in [xdim,*filedims,*([tracedim] if tracedim else [])]:
+        if dim not in ds.dims:
+            raise ValueError(f'{dim} is not a dim of ds, {list(ds.dims)}')
+    extra = set(ds.dims) - {xdim,tracedim,*filedims}
+    if extra:
+        raise ValueError(f'{sorted(map(str,extra))} of ds would need a capsule (filedims) or trace (tracedim) each')
+    if compress is not None and compress not in _codecSuffix:
+        raise ValueError(f"compress must be one of {list(_codecSuffix)} or None, not {compress}")
+    if pathTemplate is None:
+        pathTemplate = '/'.join([*(f'{{{dim}}}' for dim in filedims[:-1]),
+            f'ts_{{{filedims[-1]}}}.json' if filedims else 'ts.json'])
+    dirTemplate,nameTemplate = _splitTemplate(pathTemplate,filedims)
+    if outHTMLdir is not None and not callable(outHTMLdir):
+        reportdir = Path(outHTMLdir)
+        outHTMLdir = lambda reldir: reportdir/f"{reldir.replace('/','_') or outpth.name}{htmlsuffstr}.html"
+
+    # every capsule up front, so each capsule dir knows what it holds
+    coords = [ds[dim].values for dim in filedims]
+    paths, dirs, fileattrz, keys = {}, {}, {}, {}
+    for idx in np.ndindex(*map(len,coords)):
+        key = {dim:coord[i] for dim,coord,i in zip(filedims,coords,idx)}
+        reldir = _fillTemplate(dirTemplate,key)
+        tcjson = outpth/reldir/(_fillTemplate(nameTemplate,key)+_codecSuffix.get(compress,''))
+        if tcjson in keys:
+            # 1 capsule would overwrite another, or race it with workers
+            missing = [dim for dim in filedims if dim not in dirTemplate[1::2]+nameTemplate[1::2]]
+            raise ValueError(f'{keys[tcjson]} and {key} both go to {tcjson}'
+                +(f', pathTemplate {pathTemplate!r} lacks filedims {missing}' if missing else ', duplicate coordinates?'))
+        keys[tcjson] = key
+        paths[idx] = (reldir,tcjson)
+        dirs.setdefault(reldir,[]).append(tcjson)
+        if attrz is not None:
+            fileattrz[tcjson] = attrz(key)
+    index = ds.get_index(xdim)
+    X = _formatX(index)
+    runs = {reldir:_TrialRun(outpth/reldir,tcjsons,index,ytitle=ytitle,sharedX=sharedX,
+        downsample=downsample,downsampler=downsampler,incremental=incremental,
+        attrz={tcjson:fileattrz.get(tcjson) for tcjson in tcjsons},compress=compress,compactX=compactX)
+            for reldir,tcjsons in dirs.items()}
+    remaining = {reldir:len(tcjsons) for reldir,tcjsons in dirs.items()}
+    failures = {}
+    def finishDone():
+        # a capsule dir's manifest, catalog and report go out as soon as all its capsules are
+        for reldir,left in remaining.items():
+            if left == 0:
+                remaining[reldir] = None
+                failures.update(runs[reldir].finish(outHTMLdir(reldir) if outHTMLdir else None,
+                    outpth if catalog else None,bounds))
+
+    varz = list(ds.data_vars)
+    submitted = deque()
+    def blockTasks():
+        for block in _fileBlocks(ds,filedims,_cellBytes(ds,xdim,tracedim),memory/2 if memory else None):
+            # the whole block in 1 go, shared by every capsule in it
+            with _stage('compute') as counts:
+                sub = ds[varz].isel(block).compute()
+                counts['bytes'] = sub.nbytes
+            offsets = [block[dim].start for dim in filedims]
+            tasks = []
+            for idx,df in _blockFrames(sub,index,xdim,filedims,tracedim):
+                reldir,tcjson = paths[tuple(o+i for o,i in zip(offsets,idx))]
+                task = runs[reldir].task(tcjson,df,X)
+                if task is None:
+                    remaining[reldir] -= 1
+                    continue
+                submitted.append(reldir)
+                tasks.append(task)
+            yield tasks
+    pool, ownpool = _getExecutor(workers,executor)
+    try:
+        # a block at a time, so the memory budget holds with workers too
+        for _,err in _imapBlocks(_depositGaugeDF,blockTasks(),pool,chunksize):
+            reldir = submitted.popleft()
+            runs[reldir].done(err)
+            remaining[reldir] -= 1
+            finishDone()
+        finishDone()
+    finally:
+        if ownpool:
+            pool.shutdown()
+    if failures:
+        raise DepositError(failures)
+
 def depositDSsuite(ds,outsuitepth,
             ytitle='WSEL (ft)',
             trialdim='plan',
@@ -136,64 +1151,309 @@ def depositDSsuite(ds,outsuitepth,
             STAdim = 'Gauge',
             outHTMLdir=None,
             htmlsuffstr='',
+            workers=None,
+            executor='process',
+            chunksize=8,
+            sharedX=False,
+            downsample=None,
+            downsampler='lttb',
+            incremental=False,
+            catalog=False,
+            metrics=None,
+            compress=None,
+            compactX=False,
+            memory=2**30,
         ):
-    '''if outHTMLdir, bounce each trial (along trialdim) in DS suite there\n
-    htmlsuffstr: additional text in outHTMLdir/f'{plan}{htmlsuffstr}.html' outputs'''
-    assert set(ds.dims) == {tdim,STAdim,trialdim}, (set(ds.dims) ,{tdim,STAdim,trialdim})
-
-    planz = ds[trialdim].values
-    for plan in planz:
-        outtrialpth = outsuitepth/str(plan)
-        pln = ds.sel({trialdim:plan})
-        pln=pln.drop(trialdim)
-        depositDStrial(pln,outtrialpth,ytitle=ytitle,tdim=tdim,STAdim=STAdim,
-            outHTML=outHTMLdir/f'{plan}{htmlsuffstr}.html' if outHTMLdir else None)
+    '''bounce each trial (along trialdim) of DS suite to outsuitepth/{trial}/ts_{gauge}.json, and if outHTMLdir,
+    its report to outHTMLdir/f'{plan}{htmlsuffstr}.html'\n
+    metrics: True to compute suiteMetrics of ds (Sim vs Obs) for every plan and gauge in 1 pass, or a
+    suiteMetrics Dataset, written to each gauge capsule's attrz and plotted against metricBounds\n
+    workers, executor, chunksize, sharedX, downsample, downsampler, incremental, catalog, compress, compactX, memory:
+    see depositDataset, which this is over (trialdim, STAdim)\n
+    a failing gauge doesn't stop the suite, all failures are raised together in a DepositError at the end'''
+    if metrics is True:
+        metrics = suiteMetrics(ds,tdim=tdim).compute()
+    attrz = None
+    if metrics is not None:
+        metricAttrz = {plan:_metricAttrz(metrics.sel({trialdim:plan}),STAdim) for plan in metrics[trialdim].values}
+        attrz = lambda key: metricAttrz[key[trialdim]].get(key[STAdim])
+    depositDataset(ds,outsuitepth,xdim=tdim,filedims=(trialdim,STAdim),pathTemplate=f'{{{trialdim}}}/ts_{{{STAdim}}}.json',
+        ytitle=ytitle,outHTMLdir=outHTMLdir,htmlsuffstr=htmlsuffstr,workers=workers,executor=executor,chunksize=chunksize,
+        sharedX=sharedX,downsample=downsample,downsampler=downsampler,incremental=incremental,catalog=catalog,
+        attrz=attrz,bounds=metricBounds if metrics is not None else None,compress=compress,compactX=compactX,memory=memory)
 
 def depositDStrial(ds,outtrialpth,
             outHTML=None,
             ytitle='WSEL (ft)',
             tdim = 'Time (UTC)',
-            STAdim = 'Gauge'
+            STAdim = 'Gauge',
+            workers=None,
+            executor='process',
+            chunksize=8,
+            sharedX=False,
+            downsample=None,
+            downsampler='lttb',
+            incremental=False,
+            catalog=False,
+            metrics=None,
+            compress=None,
+            compactX=False,
+            memory=2**30,
         ):
-    '''if outHTML Path, plot full trial there'''
-    assert set(ds.dims) == {tdim,STAdim}, (set(ds.dims) ,{tdim,STAdim})
-    
-    outtrialpth.mkdir(parents=True,exist_ok=True)
-    gauges = ds[STAdim].values
-    for gaugename in gauges:
-        tcjson = outtrialpth/f'ts_{gaugename}.json'
-        gage = ds.sel({STAdim:gaugename})
-        gage=gage.drop(STAdim)
-        depositDS(gage,tcjson,ytitle=ytitle,tdim=tdim)
+    '''bounce each gauge of trial DS to outtrialpth/ts_{gauge}.json, if outHTML Path, plot full trial there\n
+    workers, executor, chunksize, sharedX, downsample, downsampler, incremental, metrics, compress, compactX, memory:
+    see depositDSsuite\n
+    catalog: index the capsules into outtrialpth/_catalog.sqlite, see updateCatalog/queryCatalog\n
+    a failing gauge doesn't stop the trial, all failures are raised together in a DepositError at the end'''
+    if metrics is True:
+        metrics = suiteMetrics(ds,tdim=tdim).compute()
+    attrz = None
+    if metrics is not None:
+        metricAttrz = _metricAttrz(metrics,STAdim)
+        attrz = lambda key: metricAttrz.get(key[STAdim])
+    depositDataset(ds,outtrialpth,xdim=tdim,filedims=(STAdim,),pathTemplate=f'ts_{{{STAdim}}}.json',
+        ytitle=ytitle,outHTMLdir=(lambda reldir: outHTML) if outHTML else None,workers=workers,executor=executor,
+        chunksize=chunksize,sharedX=sharedX,downsample=downsample,downsampler=downsampler,incremental=incremental,
+        catalog=catalog,attrz=attrz,bounds=metricBounds if metrics is not None else None,
+        compress=compress,compactX=compactX,memory=memory)
+
+class _TrialRun:
+    '''bookkeeping of depositing the capsules tcjsons of 1 capsule dir: shared x, incremental manifest and attrz\n
+    task() makes the _depositGaugeDF task for a capsule's df (None if it's unchanged), done() records how
+    each submitted task went, in order, and finish() writes the manifest, catalog and report'''
+    def __init__(self,outtrialpth,tcjsons,index,
+            ytitle='WSEL (ft)',
+            sharedX=False,
+            downsample=None,
+            downsampler='lttb',
+            incremental=False,
+            attrz=None,
+            compress=None,
+            compactX=False,
+        ):
+        if sharedX and downsample:
+            raise ValueError("downsample picks x rows per gauge, it can't be combined with sharedX")
+        if compress is not None and compress not in _codecSuffix:
+            raise ValueError(f"compress must be one of {list(_codecSuffix)} or None, not {compress}")
+        outtrialpth.mkdir(parents=True,exist_ok=True)
+        self.outtrialpth, self.tcjsons, self.incremental = outtrialpth, tcjsons, incremental
+        self.manifest = _readManifest(outtrialpth) if incremental else {}
+        xref = None
+        if sharedX:
+            xref = '_x.json'+_codecSuffix.get(compress,'')
+            xkey = _frameHash(pd.DataFrame(index=index),{'compactX':compactX})
+            # left alone when unchanged, so reports over this dir stay up to date too
+            if self.manifest.get('x') != xkey or not (outtrialpth/xref).exists():
+                writeXsidecar(outtrialpth/xref,index,compactX=compactX)
+            self.manifest['x'] = xkey
+        self.known = self.manifest.get('capsules',{})
+        self.params = {'ytitle':ytitle,'xref':xref,'downsample':downsample,'downsampler':downsampler,'compactX':compactX}
+        self.attrz = attrz or {}
+        self.sharedX = sharedX
+        self.hashes, self.submitted, self.skipped, self.failures = {}, deque(), 0, {}
+
+    def task(self,tcjson,df,X):
+        if self.incremental:
+            self.hashes[tcjson.name] = key = _frameHash(df,{**self.params,'attrz':self.attrz.get(tcjson)})
+            if self.known.get(tcjson.name) == key and tcjson.exists():
+                self.skipped += 1
+                return None
+        self.submitted.append(tcjson)
+        p = self.params
+        return (df,tcjson,p['ytitle'],None if self.sharedX else X,p['xref'],p['downsample'],p['downsampler'],
+            self.attrz.get(tcjson),p['compactX'])
+
+    def done(self,err):
+        tcjson = self.submitted.popleft()
+        if err:
+            self.failures[tcjson] = err
+            self.hashes.pop(tcjson.name,None)
+            logger.error('Failed to bounce %s:\n%s',tcjson,err)
+        else:
+            logger.info('Bounced to %s',tcjson)
+
+    def finish(self,outHTML=None,catalog=None,bounds=None):
+        '''returns the failures'''
+        if self.incremental:
+            self.manifest['capsules'] = self.hashes
+            _writeManifest(self.outtrialpth,self.manifest)
+            logger.info('%s unchanged capsules left as they were',self.skipped)
+        logger.info('Serialized to %s',self.outtrialpth)
+        if catalog is not None:
+            updateCatalog(catalog,[tcjson for tcjson in self.tcjsons if tcjson not in self.failures])
+
+        if outHTML:
+            outHTML.parent.mkdir(parents=True,exist_ok=True)
+            toHTML(self.outtrialpth,outHTML,incremental=self.incremental,bounds=bounds)
+            logger.info('%s plotted to %s',self.outtrialpth,outHTML)
+        return self.failures
+
+def _frameHash(df,params={}):
+    '''content hash of df's index, columns and values plus the deposit params that shape its capsule'''
+    h = hashlib.blake2b(digest_size=16)
+    h.update(json.dumps({'version':_manifestVersion,'columns':[str(col) for col in df.columns],
+        'index':str(df.index.dtype),**params},sort_keys=True,default=str).encode())
+    for vals in chain([df.index.values],(df[col].values for col in df.columns)):
+        vals = np.asarray(vals)
+        h.update(np.ascontiguousarray(vals).view(np.uint8) if vals.dtype.kind in 'fiubmM'
+            else repr(vals.tolist()).encode())
+    return h.hexdigest()
+
+# bump when capsule output changes for the same inputs, so incremental runs redo everything
+_manifestVersion = 1
+
+def _readManifest(dirpth):
+    '''the _manifest.json incremental deposits/reports keep in dirpth, {} if there isn't a readable one\n
+    {'x': hash of the shared x, 'capsules':{name: _frameHash}, 'reports':{html path: _reportKey}}'''
+    try:
+        return json.loads((dirpth/'_manifest.json').read_text())
+    except (OSError,ValueError):
+        return {}
+
+def _writeManifest(dirpth,manifest):
+    tmp = dirpth/'._manifest.json.tmp'
+    tmp.write_text(json.dumps(manifest,indent=1))
+    os.replace(tmp,dirpth/'_manifest.json')
+
+# goodness of fit of sim vs obs, for the attrz table
+# "satisfactory" thresholds, as in Moriasi et al. (2007) for NSE
+metricBounds = {
+    'corr':{'lbound':0.7},
+    'NSE':{'lbound':0.5},
+}
 
-    print(f'Serialized to {outtrialpth}')
+def suiteMetrics(ds,sim='Sim',obs='Obs',tdim='Time (UTC)') -> xr.Dataset:
+    '''corr, MAE, RMSE and NSE of ds[sim] vs ds[obs] along tdim, for every gauge, plan etc at once\n
+    vectorized xarray reductions over the timesteps both have, so a whole (dask backed) suite is 1 pass;
+    NaN with fewer than 2 such timesteps, and for corr/NSE where obs doesn't vary\n
+    see metricBounds for bounds to plot them against'''
+    s,o = xr.broadcast(ds[sim],ds[obs])
+    valid = s.notnull() & o.notnull()
+    s,o = s.where(valid),o.where(valid)
+    err = s-o
+    sdev,odev = s-s.mean(tdim),o-o.mean(tdim)
+    ssobs = (odev**2).sum(tdim)
+    varies = ssobs > 0
+    metrics = xr.Dataset({
+        'corr':((sdev*odev).sum(tdim)/np.sqrt((sdev**2).sum(tdim)*ssobs.where(varies))),
+        'MAE':abs(err).mean(tdim),
+        'RMSE':np.sqrt((err**2).mean(tdim)),
+        'NSE':1-(err**2).sum(tdim)/ssobs.where(varies),
+    })
+    return metrics.where(valid.sum(tdim) >= 2)
 
-    if outHTML:
-        outHTML.parent.mkdir(parents=True,exist_ok=True)
-        toHTML(outtrialpth,outHTML)
-        print(f'{outtrialpth} plotted to {outHTML}')
+def _metricAttrz(metrics,STAdim='Gauge'):
+    '''{gauge: attrz} from a trial's suiteMetrics, Name first for the plot table header, values to 2 decimals'''
+    df = metrics.reset_coords(drop=True).to_dataframe()
+    return {gauge:{'Name':str(gauge),**{key:None if pd.isna(val) else round(float(val),2) for key,val in row.items()}}
+        for gauge,row in df.iterrows()}
+
+def _chunkSizes(ds,dim):
+    '''ds's dask chunk sizes along dim, None if it isn't chunked there'''
+    try:
+        return ds.chunksizes.get(dim)
+    except ValueError: # inconsistent chunks between vars
+        return None
+
+def _cellBytes(ds,xdim='Time (UTC)',tracedim=None):
+    '''bytes of 1 capsule of ds once computed, every var broadcast along xdim (and tracedim)'''
+    traces = ds.sizes[tracedim] if tracedim else 1
+    return max(1,ds.sizes[xdim]*traces*sum(ds[var].dtype.itemsize for var in ds.data_vars))
+
+def _chunkSlices(sizes,limit):
+    '''slices along a dim chunked into sizes, consecutive chunks merged while they add up to at most limit,
+    and chunks bigger than limit split into limit long pieces (each of which computes that chunk again)'''
+    slices, start, n = [], 0, 0
+    for size in sizes:
+        if n and n+size > limit:
+            slices += [slice(start,start+n)]
+            start, n = start+n, 0
+        if size > limit:
+            slices += [slice(start+a,start+min(a+limit,size)) for a in range(0,size,limit)]
+            start += size
+        else:
+            n += size
+    if n:
+        slices += [slice(start,start+n)]
+    return slices
+
+def _fileBlocks(ds,filedims,cell,memory=None):
+    '''[{filedim: slice}] blocks to compute ds in, following its dask chunks so each chunk is computed once,
+    with every block at most memory bytes (of cell bytes per capsule)\n
+    the leading filedims go a dask chunk at a time (1 at a time if ds isn't chunked along them), halved if a single
+    capsule along the last filedim of all of them won't fit in memory; chunks of the last filedim (all of it if
+    it isn't chunked) are merged up to memory, or split if 1 won't fit'''
+    if not filedims:
+        return [{}]
+    *lead,last = filedims
+    limit = max(1,int(memory//cell)) if memory else None
+    def chunks(sizes):
+        bounds = np.cumsum((0,)+tuple(sizes))
+        return [slice(a,b) for a,b in zip(bounds[:-1],bounds[1:])]
+    def fit(block):
+        n = int(np.prod([s.stop-s.start for s in block.values()]))
+        if limit is None or n <= limit:
+            return [block]
+        dim = max(block,key=lambda dim: block[dim].stop-block[dim].start)
+        s = block[dim]
+        mid = (s.start+s.stop)//2
+        return fit({**block,dim:slice(s.start,mid)}) + fit({**block,dim:slice(mid,s.stop)})
+    lastsizes = _chunkSizes(ds,last) or (ds.sizes[last],)
+    blocks = []
+    for leads in product(*(chunks(_chunkSizes(ds,dim) or (1,)*ds.sizes[dim]) for dim in lead)):
+        for block in fit(dict(zip(lead,leads))):
+            n = int(np.prod([s.stop-s.start for s in block.values()]))
+            batches = _chunkSlices(lastsizes,max(1,limit//n)) if limit else chunks(lastsizes)
+            blocks += [{**block,last:batch} for batch in batches]
+    return blocks
+
+def _blockFrames(sub,index,xdim='Time (UTC)',filedims=(),tracedim=None):
+    '''yields (position along sub's filedims, df) for every capsule of an already computed block sub of a dataset,
+    df being what depositDS would get from ds.sel() of that capsule, with a column per var (and tracedim value)'''
+    order = [*filedims,*([tracedim] if tracedim else []),xdim]
+    blocks = {}
+    with _stage('slice',bytes=sub.nbytes):
+        for var in sub.data_vars:
+            da = sub[var]
+            # vars missing a dim get broadcast across it, as .sel().to_pandas() would
+            da = da.expand_dims({dim:sub[dim] for dim in order if dim not in da.dims})
+            blocks[var] = da.transpose(*order).values
+    traces = [str(val) for val in sub[tracedim].values] if tracedim else None
+    for idx in np.ndindex(*(sub.sizes[dim] for dim in filedims)):
+        if tracedim:
+            cols = {(trace if len(blocks) == 1 else f'{var} {trace}'):block[idx][j]
+                for var,block in blocks.items() for j,trace in enumerate(traces)}
+        else:
+            cols = {var:block[idx] for var,block in blocks.items()}
+        yield idx, pd.DataFrame(cols,index=index,copy=False)
+
+def _depositGaugeDF(df,tcjson,ytitle='WSEL (ft)',X=None,xref=None,downsample=None,downsampler='lttb',attrz=None,
+        compactX=False):
+    '''the deposit() call depositDataset makes, for a capsule already pulled out by _blockFrames'''
+    deposit(tcjson,df,ytitle=ytitle,data={'line':{'width':1}},X=X,xref=xref,
+        downsample=downsample,downsampler=downsampler,attrz=attrz,compactX=compactX)
 
 def depositDS(ds,tcjson,
             ytitle='WSEL (ft)',
             tdim = 'Time (UTC)',
+            downsample=None,
+            downsampler='lttb',
         ):
-    '''at gaugename to timecapsule'''
-    assert set(ds.dims) == {tdim}, (set(ds.dims) ,tdim)
-    all_coords = set(ds.coords)
-    dim_coords = set(ds.dims)
-    non_dim_coords = all_coords - dim_coords
-
-    gage = ds.drop_vars(non_dim_coords)
-    df = gage.to_pandas()
-
-    deposit(tcjson,df,ytitle=ytitle,data={'line':{'width':1}})
-    print(f'Bounced to {tcjson}')
-
+    '''at gaugename to timecapsule\n
+    downsample, downsampler: see deposit'''
+    tcjson = Path(tcjson)
+    # no filedims, so the file name is taken literally
+    depositDataset(ds,tcjson.parent,xdim=tdim,pathTemplate=tcjson.name,ytitle=ytitle,
+        downsample=downsample,downsampler=downsampler)
 
 from pathlib import Path
 import pandas as pd, numpy as np
 import json
 import plotly.graph_objects as go
+import plotly.io as pio
+from plotly.offline import get_plotlyjs_version
+from plotly.io.json import to_json_plotly
+from urllib.parse import quote
 from plotly.subplots import make_subplots
 from copy import deepcopy
 import subprocess
@@ -219,40 +1479,23 @@ def plot(timecapsule,title='',
     bounds=None,
     green=f'rgba(0, 255, 64,{alpha})',
     red=f'rgba(255, 0, 34,{alpha})',
+    xrange=None,
     ):
-    '''timecapsule: Path to json or dict object'''
+    '''timecapsule: Path to json or dict object\n
+    xrange: (x0,x1) zoom window to plot, read from the finest pyramid tiles that cover it if the capsule has a pyramid'''
 
     # read in tc
-    tc = deepcopy(timecapsule) if isinstance(timecapsule,dict) \
-        else json.load(open(timecapsule)) 
+    tc = _plotTC(timecapsule,xrange)
 
-
-    # creates list of subplot formats to plot tables properly
-    specsInput=[[{'type':'xy'},{'type':'domain'}]]#*len(tcs)
-
-    absTblWidth = 350
-    column_widths = [(width-absTblWidth)/width , absTblWidth/width]
     # creates figure and sets number of rows and columns, relative column widths, spacings between plots, titles, and formats
     # print('DATA?','data' in tc)
     # print(bold(title) if 'data' in tc else 'no data')
-
-    fig=make_subplots(
-        rows=1,
-        cols=2,
-        column_widths=column_widths,
-        vertical_spacing=0.02,
-        horizontal_spacing=0.02,
-        subplot_titles=[bold(title) if 'data' in tc else '',''],#*len(tcs)*2,
-        specs=specsInput)
+    fig = _subplots(width,bold(title) if 'data' in tc else '')
     
     # add scatter plot if tc['data']
     [
     fig.add_trace(
-        go.Scatter(x=tc['x'],
-            **({'marker':{'color':cmap[i]}} if len(cmap)>i else {}),
-            **{'mode':'lines',# defaults
-                **data}, # defaults get overriden if they appear in data
-            ),
+        go.Scatter(**_scatterSpec(tc['x'],data,i,cmap)),
     row=1,
     col=1)
         for i,data in enumerate(_emptyLister(tc)['data'])
@@ -260,64 +1503,148 @@ def plot(timecapsule,title='',
 
     #add table
     if 'attrz' in tc:
-        # demo
-        if 'oops' in tc['attrz'].keys():
-            tc['attrz'].pop('oops')
-
-        key = list(tc['attrz'].keys())[0]
-        headr = [key, tc['attrz'].pop(key) ]
-        headr = bold(headr)
-
-        # attrz bounds logic setup:
-        if bounds:
-            # add bounds for items prepended by 'Mean ' as well
-            boundz = { **bounds,
-                **{f'Mean {key}':val for key,val in bounds.items()} }
-            boundz = {col:_bothBounds(bnds) for col,bnds in boundz.items()}
-            def testbounds(key,val):
-                if key not in boundz:
-                    return 'rgba(0,0,0,0)' 
-                if val is None:
-                    return red
-                if      val >= boundz[key]['lbound'] \
-                    and val <= boundz[key]['rbound']:
-                    return green 
-                else:
-                    return red
-
-        fig.add_trace(go.Table(
-            # columnwidth=300000000000000,
-            header=dict(values=headr,
-                        fill_color='rgba(0,0,0,0)',
-                        font=dict(size=14),
-                                    # align='center'
-                                    ),
-                cells=dict(values=[
-                    bold(
-                        list(tc['attrz'].keys())
-                    ),
-                        list(tc['attrz'].values())
-                    ],
-                            fill_color=[[
-                                testbounds(key,val) 
-                                    if bounds else 'rgba(0,0,0,0)'
-                                        for key,val in tc['attrz'].items() 
-                            ]]*2,
-
-                                    # font=dict(
-                                    #     family='roboto',
-                                    #     size=16),
-                        # align='',
-                            ),
-                        # format=['','.2f','.2f'],
-                        # height=30
-                        ),
+        fig.add_trace(go.Table(**_tableSpec(tc['attrz'],bounds,green,red)),
             row=1,
             col=2
             )
 
     # workaround for crappy plotly bug https://community.plotly.com/t/subplot-titles-disappearing-when-adding-annotations/5256/8
     annotations = [a.to_plotly_json() for a in fig["layout"]["annotations"]]
+    fig=fig.update_layout(_plotLayout(tc,annotations,width,height,bgcolor))
+    return fig
+
+def plotSpec(timecapsule,title='',
+    width=1600,height=600,
+    cmap=["#b3294e","#4829B2",'#0ff54c','#f2b200'],
+    bgcolor = 'hsl(210, 10%, 60%)',
+    bounds=None,
+    green=f'rgba(0, 255, 64,{alpha})',
+    red=f'rgba(255, 0, 34,{alpha})',
+    xrange=None,
+    ):
+    '''plot() as a plain plotly.js figure dict {'data':[...],'layout':{...}}, built straight from the capsule
+    without graph_objects validation; render it with plotly.io.to_html(spec,validate=False)\n
+    the subplot grid and default template come from a make_subplots figure cached per width (see _subplotGrid)'''
+    tc = _plotTC(timecapsule,xrange)
+    layout,tabledomain = _subplotGrid(width,'data' in tc)
+    # a capsule without data gets no subplot title, as in plot()
+    annotations = [{**a,'text':bold(title)} for a in layout.get('annotations',[])]
+
+    traces = [
+        {'type':'scatter',**_scatterSpec(tc['x'],data,i,cmap),'xaxis':'x','yaxis':'y'}
+            for i,data in enumerate(_emptyLister(tc)['data']) ]
+    if 'attrz' in tc:
+        traces += [{'type':'table',**_tableSpec(tc['attrz'],bounds,green,red),'domain':tabledomain}]
+
+    layout = deep_update(layout,_plotLayout(tc,annotations,width,height,bgcolor))
+    if not layout['annotations']:
+        # plotly leaves an empty annotations list out of the figure
+        del layout['annotations']
+    return {'data':traces,'layout':layout}
+
+def _plotTC(timecapsule,xrange=None):
+    '''the capsule dict plot() draws, zoomed to xrange if given'''
+    tc = _loadTC(timecapsule)
+    if xrange is not None:
+        df = zoomDF(timecapsule,xrange) if 'pyramid' in tc and not isinstance(timecapsule,dict) \
+            else toDF(tc,xrange=xrange)
+        tc['x'] = _formatX(df.index)
+        for entry in tc['data']:
+            entry['y'] = nanmask2None(df[entry['name']])
+    return tc
+
+def _subplots(width,title):
+    '''plot()'s figure: a line plot with title and the attrz table beside it'''
+    # creates list of subplot formats to plot tables properly
+    specsInput=[[{'type':'xy'},{'type':'domain'}]]#*len(tcs)
+
+    absTblWidth = 350
+    column_widths = [(width-absTblWidth)/width , absTblWidth/width]
+    return make_subplots(
+        rows=1,
+        cols=2,
+        column_widths=column_widths,
+        vertical_spacing=0.02,
+        horizontal_spacing=0.02,
+        subplot_titles=[title,''],#*len(tcs)*2,
+        specs=specsInput)
+
+@lru_cache(maxsize=None)
+def _subplotGrid(width,titled):
+    '''(layout,table domain) of _subplots(width) as plain dicts, layout with the default template
+    and a subplot title annotation if titled; cached, so callers must not mutate them'''
+    fig = _subplots(width,'<b>title</b>' if titled else '')
+    dom = fig.get_subplot(1,2)
+    return fig.to_plotly_json()['layout'], {'x':list(dom.x),'y':list(dom.y)}
+
+def _scatterSpec(X,data,i,cmap):
+    '''scatter trace kwargs for the i-th capsule trace data'''
+    return dict(x=X,
+            **({'marker':{'color':cmap[i]}} if len(cmap)>i else {}),
+            **{'mode':'lines',# defaults
+                **data}, # defaults get overriden if they appear in data
+            )
+
+def _tableSpec(attrz,bounds=None,
+    green=f'rgba(0, 255, 64,{alpha})',
+    red=f'rgba(255, 0, 34,{alpha})'):
+    '''table trace kwargs for capsule attrz, the first item as header, cells colored by bounds'''
+    attrz = dict(attrz)
+    # demo
+    if 'oops' in attrz.keys():
+        attrz.pop('oops')
+
+    key = list(attrz.keys())[0]
+    headr = [key, attrz.pop(key) ]
+    headr = bold(headr)
+
+    # attrz bounds logic setup:
+    if bounds:
+        # add bounds for items prepended by 'Mean ' as well
+        boundz = { **bounds,
+            **{f'Mean {key}':val for key,val in bounds.items()} }
+        boundz = {col:_bothBounds(bnds) for col,bnds in boundz.items()}
+        def testbounds(key,val):
+            if key not in boundz:
+                return 'rgba(0,0,0,0)' 
+            if val is None:
+                return red
+            if      val >= boundz[key]['lbound'] \
+                and val <= boundz[key]['rbound']:
+                return green 
+            else:
+                return red
+
+    return dict(
+        # columnwidth=300000000000000,
+        header=dict(values=headr,
+                    fill={'color':'rgba(0,0,0,0)'},
+                    font=dict(size=14),
+                                # align='center'
+                                ),
+            cells=dict(values=[
+                bold(
+                    list(attrz.keys())
+                ),
+                    list(attrz.values())
+                ],
+                        fill={'color':[[
+                            testbounds(key,val) 
+                                if bounds else 'rgba(0,0,0,0)'
+                                    for key,val in attrz.items() 
+                        ]]*2},
+
+                                # font=dict(
+                                #     family='roboto',
+                                #     size=16),
+                    # align='',
+                        ),
+                    # format=['','.2f','.2f'],
+                    # height=30
+        )
+
+def _plotLayout(tc,annotations,width=1600,height=600,bgcolor='hsl(210, 10%, 60%)'):
+    '''plot()'s layout defaults under the capsule's own layout, subplot title annotations first'''
     lyt = {
         'paper_bgcolor':bgcolor,
         'plot_bgcolor':bgcolor,#'hsla(210, 26%, 14%, 0)',
@@ -351,9 +1678,7 @@ def plot(timecapsule,title='',
         lyt['annotations'] = annotations + lyt['annotations']
     else:
         lyt['annotations'] = annotations
-        
-    fig=fig.update_layout(lyt)
-    return fig
+    return lyt
 
 def boundsToEnglish(bounds,newline='<br>'):
     '''converts bounds dict to readable string'''
@@ -380,6 +1705,126 @@ htmlcfg = {'displaylogo': False,
     ],
 }
 
+def _figDiv(jsn,first=False,plotkw={},fast=False):
+    '''plot jsn and render it as a html div, with the plotly.js cdn script tag if it's the first in the doc\n
+    fast: render plotSpec's plain dict without building and validating a plotly Figure'''
+    with _stage('figure',jsn):
+        fig = plotSpec(jsn,**plotkw) if fast else plot(jsn,**plotkw)
+    with _stage('to_html',jsn) as counts:
+        div = pio.to_html(fig,full_html=False,
+            config=htmlcfg,
+            include_plotlyjs='cdn' if first else False,
+            validate=not fast,
+            )
+        counts['bytes'] = len(div)
+    return div
+
+def _lazyDiv(jsn,plotkw={},src=None):
+    '''placeholder div for a lazy toHTML report: plotSpec of jsn without its template or scatter x/y,
+    which _lazyLoader's script fills in from the capsule at src once the div scrolls near the viewport'''
+    with _stage('figure',jsn):
+        spec = plotSpec(jsn,**plotkw)
+    spec['layout'].pop('template',None)
+    for trace in spec['data']:
+        if trace['type'] == 'scatter':
+            trace.pop('x',None)
+            trace.pop('y',None)
+    return (f'<div style="height:{plotkw.get("height",600)}px; width:{plotkw.get("width",1600)}px;">'
+        f'<div class="plotly-graph-div tc-lazy" data-src="{quote(src)}" style="height:100%; width:100%;"></div>'
+        f'<script type="application/json" class="tc-spec">{pio.to_json(spec,validate=False)}</script></div>')
+
+def _lazyLoader(width=1600):
+    '''the script of a lazy toHTML report, with the plot template and config shared by every div'''
+    template = _subplotGrid(width,True)[0]['template']
+    return (_lazyJS.replace('TC_TEMPLATE',to_json_plotly(template))
+        .replace('TC_CONFIG',json.dumps({**htmlcfg,'responsive':True})))
+
+# loads each .tc-lazy div's capsule when it comes within a screen of the viewport, purges it beyond 4 screens;
+# capsules may be plain, xref'd (sidecar x) or binary (buffer of little endian arrays), see deposit
+_lazyJS = '''<script>
+(function(){
+    var template = TC_TEMPLATE;
+    var config = TC_CONFIG;
+    function parse(txt){
+        // python's json writes NaN/Infinity, which JSON.parse rejects
+        try { return JSON.parse(txt); }
+        catch (e) { return JSON.parse(txt.replace(/-?Infinity|NaN/g, 'null')); }
+    }
+    function inflate(buf){
+        // a .json.gz served as is (no Content-Encoding: gzip) still starts with the gzip magic
+        var head = new Uint8Array(buf, 0, Math.min(2, buf.byteLength));
+        if (head[0] !== 0x1f || head[1] !== 0x8b) return buf;
+        return new Response(new Blob([buf]).stream().pipeThrough(new DecompressionStream('gzip'))).arrayBuffer();
+    }
+    function get(url, as){
+        return fetch(url).then(function(r){
+            if (!r.ok) throw new Error(url + ': ' + r.status);
+            return r.arrayBuffer();
+        }).then(inflate).then(function(buf){
+            return as === 'buffer' ? buf : parse(new TextDecoder().decode(buf));
+        });
+    }
+    function wall(ms){
+        return ms === null ? null : new Date(ms).toISOString().slice(0, 19).replace('T', ' ');
+    }
+    function expand(x){
+        // compact x: {start, step, count} or {runs: [...] of them}, a '%Y-%m-%d %X' start and a step in ms for unit ms
+        var out = [];
+        (x.runs || [x]).forEach(function(run){
+            var x0 = x.unit === 'ms' ? Date.parse(run.start.replace(' ', 'T') + 'Z') : run.start;
+            for (var i = 0; i < run.count; i++) out.push(x0 + i * run.step);
+        });
+        return x.unit === 'ms' ? out.map(wall) : out;
+    }
+    function column(buf, desc){
+        if (!desc || Array.isArray(desc)) return desc;
+        if (desc.runs || 'start' in desc) return expand(desc);
+        var Arr = {'<f8': Float64Array, '<f4': Float32Array}[desc.dtype];
+        if (!Arr) throw new Error('unsupported dtype ' + desc.dtype);
+        var out = Array.from(new Arr(buf, desc.offset, desc.count), function(v){ return isNaN(v) ? null : v; });
+        return desc.unit === 'ms' ? out.map(wall) : out;
+    }
+    function load(div){
+        var src = new URL(div.dataset.src, document.baseURI).href;
+        var spec = JSON.parse(div.parentNode.querySelector('script.tc-spec').textContent);
+        return get(src).then(function(tc){
+            return Promise.all([
+                tc.xref ? get(new URL(tc.xref, src).href).then(function(s){ return s.x; }) : tc.x,
+                tc.buffer ? get(new URL(tc.buffer, src).href, 'buffer') : null
+            ]).then(function(parts){
+                var x = column(parts[1], parts[0]);
+                spec.data.filter(function(t){ return t.type === 'scatter'; }).forEach(function(t, i){
+                    t.x = x;
+                    t.y = column(parts[1], tc.data[i].y);
+                });
+                spec.layout.template = template;
+                return Plotly.newPlot(div, spec.data, spec.layout, config);
+            });
+        });
+    }
+    var near = new IntersectionObserver(function(entries){
+        entries.forEach(function(e){
+            var div = e.target;
+            if (!e.isIntersecting || div.dataset.state) return;
+            div.dataset.state = 'loading';
+            load(div).then(
+                function(){ div.dataset.state = 'loaded'; },
+                function(err){ div.dataset.state = 'failed'; div.textContent = String(err); console.error(err); });
+        });
+    }, {rootMargin: '100% 0px'});
+    var far = new IntersectionObserver(function(entries){
+        entries.forEach(function(e){
+            var div = e.target;
+            if (e.isIntersecting || div.dataset.state !== 'loaded') return;
+            Plotly.purge(div);
+            div.dataset.state = '';
+        });
+    }, {rootMargin: '400% 0px'});
+    document.querySelectorAll('div.tc-lazy').forEach(function(div){ near.observe(div); far.observe(div); });
+})();
+</script>
+'''
+
 def toHTML(TCdir,outHTML,bounds=None,
     description=lambda reqs: f'Metric targets:<br>{reqs}',
     doctitle='How to use this document',
@@ -391,35 +1836,63 @@ def toHTML(TCdir,outHTML,bounds=None,
     green=f'rgba(0, 255, 64,{alpha})',
     red=f'rgba(255, 0, 34,{alpha})',
     cmap=["#4829B2","#b3294e",'#0ff54c','#f2b200'],
-    openHTML=True
+    openHTML=True,
+    workers=None,
+    executor='process',
+    chunksize=4,
+    fast=False,
+    lazy=False,
+    incremental=False,
+    where=None,
+    params=(),
+    orderby=None,
     ):
     '''
-
+    where, params, orderby: pick and order the capsules to plot with a queryCatalog query, on the _catalog.sqlite
+    in TCdir or the closest dir above it (see updateCatalog); insights still go first\n
+    incremental: skip rewriting outHTML if neither the files in TCdir (by name, size and mtime) nor the
+    report's settings changed since it was last written, as recorded in TCdir/_manifest.json\n
+    lazy: write a light shell page instead, where each plot div fetches its capsule (by path relative to outHTML)
+    only once it scrolls near the viewport, and is purged again once far off screen; see _lazyDiv. Browsers
+    won't fetch from file:// pages, so serve TCdir and outHTML's dir over http (eg python -m http.server)\n
+    fast: render each capsule with plotSpec instead of plot, skipping plotly's Figure validation\n
+    workers: number of processes/threads to build and render the figures across, None to run serially\n
+    executor, chunksize: see depositDSsuite\n
+    divs are written to outHTML as they come back in order, so only a window of figures is held in memory;
+    the doc is assembled in a temp file next to outHTML and moved into place once complete
     '''
-    capsules = list(TCdir.glob('*.json'))
+    if where or orderby:
+        suitepth = next((d for d in [TCdir,*TCdir.resolve().parents] if (d/'_catalog.sqlite').exists()),None)
+        if suitepth is None:
+            raise FileNotFoundError(f'no _catalog.sqlite in or above {TCdir}, see updateCatalog')
+        trial = TCdir.resolve().relative_to(suitepth.resolve()).as_posix()
+        rows = queryCatalog(suitepth,'trial = ?'+(f' AND ({where})' if where else ''),(trial,*params),orderby)
+        capsules = [TCdir/Path(path).name for path in rows['path']]
+    else:
+        # _ prefixed jsons are sidecars (eg shared _x.json), not capsules
+        capsules = [f for f in TCdir.glob('*.json*') if _isCapsule(f)]
     # send insights to the front if it exists
     jsons = pd.Series(capsules)
-    stems = jsons.map(lambda f:f.stem)
+    stems = jsons.map(_capsuleStem)
     insight = stems=='insights'
     jsons = jsons[insight].to_list() + jsons[~insight].to_list() 
     # [ print('TITLE',plotTitleFunc(jsn.stem.replace('ts_',''))) for jsn in jsons ]
-    figz = [plot(jsn,
-                title=plotTitleFunc(jsn.stem.replace('ts_','')),
-                bounds=bounds,
+    # titles are made here, plotTitleFunc may be a lambda that can't be pickled to a worker
+    plotkw = dict(bounds=bounds,
                 width=width,height=height,
                 cmap=cmap,
                 bgcolor = bgcolor,
                 green=green,
                 red=red)
-            for jsn in jsons]
-    
-    # concat all to 1 html ala 
-    # https://stackoverflow.com/questions/59868987/plotly-saving-multiple-plots-into-a-single-html/59869358#59869358
-    divs =  ''.join([ fig.to_html(full_html=False, 
-            config=htmlcfg,
-            include_plotlyjs='cdn' if row==0 else False
-            )
-        for row,fig in enumerate(figz) ])
+    titles = [plotTitleFunc(_capsuleStem(jsn).replace('ts_','')) for jsn in jsons]
+    if lazy:
+        render = _lazyDiv
+        tasks = [(jsn,{**plotkw,'title':title},Path(os.path.relpath(jsn,outHTML.parent)).as_posix())
+            for jsn,title in zip(jsons,titles)]
+    else:
+        render = _figDiv
+        tasks = [(jsn,row==0,{**plotkw,'title':title},fast)
+            for row,(jsn,title) in enumerate(zip(jsons,titles))]
 
     descript = description(boundsToEnglish(bounds)) if bounds else description('N/A')
 
@@ -466,16 +1939,60 @@ def toHTML(TCdir,outHTML,bounds=None,
 </body>
 </html>
 '''
-    doc = doc.format(**{'divs':divs,'bgcolor':bgcolor,'doctitle':doctitle,'description':descript,
-        'width1':width1,'height1':height,'padding':padding})
+    # concat all to 1 html ala 
+    # https://stackoverflow.com/questions/59868987/plotly-saving-multiple-plots-into-a-single-html/59869358#59869358
+    # the divs are streamed in between the head and tail of doc rather than formatted into it
+    head,tail = doc.split('{divs}')
+    fmt = {'bgcolor':bgcolor,'doctitle':doctitle,'description':descript,
+        'width1':width1,'height1':height,'padding':padding}
 
-    outHTML.unlink(missing_ok=True)
-    outHTML.write_text(doc)
-    print(f'plots from\n {TCdir} written to \n{outHTML}')
+    if incremental:
+        manifest = _readManifest(TCdir)
+        reports = manifest.setdefault('reports',{})
+        key = _reportKey(TCdir,{**fmt,**plotkw,'titles':titles,'fast':fast,'lazy':lazy,
+            'where':where,'params':params,'orderby':orderby})
+        if reports.get(str(outHTML)) == key and outHTML.exists():
+            logger.info('%s is up to date with %s',outHTML,TCdir)
+            return
+
+    with _stage('report',outHTML,capsules=len(jsons)) as counts:
+        pool, ownpool = _getExecutor(workers,executor)
+        tmp = outHTML.with_name(f'.{outHTML.name}.tmp')
+        try:
+            with open(tmp,'w') as f:
+                f.write(head.format(**fmt))
+                if lazy:
+                    f.write(f'<script charset="utf-8" src="https://cdn.plot.ly/plotly-{get_plotlyjs_version()}.min.js"></script>')
+                for jsn,(div,err) in zip(jsons,_imapOrdered(render,tasks,pool,chunksize)):
+                    if err:
+                        raise RuntimeError(f'Failed to plot {jsn}:\n{err}')
+                    f.write(div)
+                if lazy:
+                    f.write(_lazyLoader(width))
+                f.write(tail.format(**fmt))
+            os.replace(tmp,outHTML)
+            counts['bytes'] = outHTML.stat().st_size
+        except BaseException:
+            tmp.unlink(missing_ok=True)
+            raise
+        finally:
+            if ownpool:
+                pool.shutdown()
+    if incremental:
+        reports[str(outHTML)] = key
+        _writeManifest(TCdir,manifest)
+    logger.info('plots from\n %s written to \n%s',TCdir,outHTML)
     if openHTML:
         # open in default web browser:
         subprocess.Popen([ "explorer", str(outHTML) ])
 
+def _reportKey(TCdir,settings):
+    '''hash of the capsules and sidecars in TCdir (name, size, mtime) and the settings of a toHTML report over it'''
+    files = [(f.name,f.stat().st_size,f.stat().st_mtime_ns) for f in sorted(TCdir.iterdir())
+        if (_isCapsule(f) or f.suffix in ('.json','.bin')) and f.name != '_manifest.json']
+    return hashlib.blake2b(json.dumps([files,settings],sort_keys=True,default=str).encode(),
+        digest_size=16).hexdigest()
+
 # attrz helper funcs:
 # def attrzFromDict(attrzdict):
 #     '''returns attrz format dict with key,value explicit\n
@@ -515,24 +2032,710 @@ def toHTML(TCdir,outHTML,bounds=None,
 #     }'''
 #     [addBound(attrz,key,**kwargz) for key,kwargz in bounds.items()]
 
-def toDF(tc) -> pd.DataFrame:
+# minimal byte level json scanning, so a capsule can be read a trace at a time from a mmap
+# (unrolled loops rather than possessive quantifiers, which need python 3.11, so a failed match
+#   still backtracks in linear time)
+_jsonStr = rb'"[^"\\]*(?:\\.[^"\\]*)*"'
+_flatArray = re.compile(rb'\[[^\[\]{}"]*(?:'+_jsonStr+rb'[^\[\]{}"]*)*\]')
+_scalar = re.compile(_jsonStr+rb'|[^,\]}\s]+')
+_ws = re.compile(rb'\s*')
+_key = re.compile(rb'\s*('+_jsonStr+rb')\s*:\s*')
+_sep = re.compile(rb'\s*([,\]}])\s*')
+_isoStamp = re.compile(r'\d{4}-\d\d-\d\d \d\d:\d\d:\d\d$')
+
+def _valueEnd(buf,i):
+    '''index just past the json value starting at buf[i]'''
+    # flat arrays (x, y) are skipped in 1 go, containers are walked item by item
+    if buf[i:i+1] == b'[':
+        # numbers/null only: the first ] closes it
+        end = buf.find(b']',i)
+        if end > 0 and all(buf.find(c,i+1,end) < 0 for c in (b'[',b'{',b'"')):
+            return end+1
+    m = _flatArray.match(buf,i)
+    if m:
+        return m.end()
+    if buf[i:i+1] in (b'[',b'{'):
+        last = None
+        for _,_,last in _items(buf,i):
+            pass
+        if last is None:
+            return _ws.match(buf,i+1).end()+1
+        return _sep.match(buf,last).start(1)+1
+    m = _scalar.match(buf,i)
+    if not m:
+        raise ValueError(f'no json value at {i}')
+    return m.end()
+
+def _items(buf,i):
+    '''yields (key,start,end) of each member of the json object at buf[i],
+    or (None,start,end) of each element if it's an array'''
+    opening = buf[i:i+1]
+    if opening not in (b'{',b'['):
+        raise ValueError(f'expected a json object or array at {i}')
+    close = b'}' if opening == b'{' else b']'
+    j = _ws.match(buf,i+1).end()
+    if buf[j:j+1] == close:
+        return
+    while True:
+        key = None
+        if opening == b'{':
+            m = _key.match(buf,j)
+            if not m:
+                raise ValueError(f'expected a key at {j}')
+            key,j = json.loads(m.group(1)), m.end()
+        end = _valueEnd(buf,j)
+        yield key, j, end
+        m = _sep.match(buf,end)
+        if not m or m.group(1) not in (b',',close):
+            raise ValueError(f'expected , or {close.decode()} at {end}')
+        if m.group(1) == close:
+            return
+        j = m.end()
+
+def _parseArray(span):
+    '''json array bytes => numpy array for numbers/null (null as NaN), else a list'''
+    lst = _loads(span)
+    if isinstance(lst,dict): # binary capsule descriptor
+        return lst
+    if any(c in span for c in (b'"',b'[',b'{',b't',b'f')): # strings, nesting, true/false
+        return lst
+    isfloat = any(c in span for c in (b'.',b'e',b'E',b'n',b'N',b'I'))
+    try:
+        return np.array(lst,dtype=np.float64 if isfloat else np.int64)
+    except (OverflowError,TypeError,ValueError): # eg ints past int64
+        return lst
+
+def _parseX(X,parseDates=True):
+    '''x values => pd.Index, deposit's '%Y-%m-%d %X' strings as a DatetimeIndex if parseDates'''
+    if _isCompactX(X):
+        X = _expandX(X)
+    if isinstance(X,pd.DatetimeIndex): # from a binary capsule or compact x
+        return X if parseDates else pd.Index(_formatXuncached(X))
+    if isinstance(X,np.ndarray):
+        return pd.Index(X)
+    first = next((x for x in X if x is not None),None)
+    if parseDates and isinstance(first,str) and _isoStamp.match(first):
+        try:
+            return pd.DatetimeIndex(pd.to_datetime(X,format='%Y-%m-%d %H:%M:%S'))
+        except (ValueError,TypeError):
+            pass
+    return pd.Index(X)
+
+def _scanTC(tc,columns=None):
+    '''memory map a capsule file and parse only x, layout, attrz and the traces named in columns\n
+    returns {'x':..., 'data':[(name,y)], 'layout':..., 'attrz':..., 'pyramid':...} (those it has)'''
+    with _mapped(tc) as buf:
+        i = _ws.match(buf,0).end()
+        parts = {'data':[]}
+        for key,start,end in _items(buf,i):
+            if key == 'x':
+                parts['x'] = _parseArray(buf[start:end])
+            elif key in ('xref','buffer'):
+                parts[key] = json.loads(buf[start:end])
+            elif key == 'data':
+                for _,tstart,_ in _items(buf,start):
+                    name,yspan = None,None
+                    for tkey,ystart,yend in _items(buf,tstart):
+                        if tkey == 'name':
+                            name = json.loads(buf[ystart:yend])
+                        elif tkey == 'y':
+                            yspan = (ystart,yend)
+                    if columns is None or name in columns:
+                        y = _parseArray(buf[yspan[0]:yspan[1]]) if yspan else []
+                        parts['data'] += [(name,y)]
+            elif key in ('layout','attrz','pyramid'):
+                parts[key] = _loads(buf[start:end])
+    return _resolveParts(tc,parts)
+
+def _resolveParts(tc,parts):
+    '''_scanTC parts of capsule file tc with a binary buffer's x and y read in, and an xref's x'''
+    if 'buffer' in parts:
+        bufpth = Path(tc).parent/parts['buffer']
+        if isinstance(parts.get('x'),dict) and not _isCompactX(parts['x']):
+            parts['x'] = _readBuffer(bufpth,parts['x'])
+        # copy the requested columns out of the memmap
+        parts['data'] = [(name,np.array(_readBuffer(bufpth,y)) if isinstance(y,dict) else y)
+            for name,y in parts.get('data',[])]
+    if 'xref' in parts and 'x' not in parts:
+        parts['x'] = _scanTC(Path(tc).parent/parts['xref'],columns=[])['x']
+    return parts
+
+def zoomDF(tc,xrange=None,maxpoints=None,columns=None,parseDates=True) -> pd.DataFrame:
+    '''toDF of a pyramid capsule (see deposit's pyramid) over xrange, read from the finest level
+    whose tiles covering xrange add up to at most maxpoints points (default 4 tiles' worth)\n
+    falls back to the overview in tc itself when no level is coarse enough, or tc has no pyramid'''
+    tc = Path(tc)
+    pyr = _loadTC(tc).get('pyramid')
+    if not pyr:
+        return toDF(tc,columns,xrange,parseDates)
+    maxpoints = maxpoints or 4*pyr['tilepoints']
+    x0,x1 = xrange if xrange is not None else (None,None)
+    cover = None
+    for level in pyr['levels']:
+        tiles = level['tiles']
+        keep = np.ones(len(tiles),dtype=bool)
+        if x1 is not None:
+            keep &= np.asarray(_parseX([tile['x0'] for tile in tiles],parseDates) <= x1)
+        if x0 is not None:
+            keep &= np.asarray(_parseX([tile['x1'] for tile in tiles],parseDates) >= x0)
+        tiles = [tile for tile,k in zip(tiles,keep) if k]
+        if sum(min(tile['rows'],pyr['tilepoints']) for tile in tiles) > maxpoints:
+            break
+        cover = tiles
+    overview = toDF(tc,columns,xrange,parseDates)
+    if not cover:
+        return overview
+    df = pd.concat([toDF(tc.parent/pyr['dir']/tile['file'],columns,xrange,parseDates) for tile in cover])
+    df.attrs = overview.attrs
+    return df
+
+def toDF(tc,columns=None,xrange=None,parseDates=True) -> pd.DataFrame:
     """
-    Convert the custom JSON dict back into a pandas DataFrame. inverse of deposit
+    Convert the custom JSON dict back into a pandas DataFrame. inverse of deposit\n
+    tc: Path to a capsule json, which is memory mapped so only x, layout, attrz and the requested traces get parsed,
+    straight into numpy arrays; or a capsule dict, which is read as is (not copied)\n
+    columns: list of trace names to load, default all\n
+    xrange: (x0,x1) to keep only x0 <= x <= x1, either may be None for open ended\n
+    parseDates: parse deposit's '%Y-%m-%d %X' x strings back into a DatetimeIndex
     """
-    jsn = deepcopy(tc) if isinstance(tc,dict) \
-        else json.load(open(tc)) 
-    # Each entry in 'data' has 'name' = column name, 'y' = column values
-    cols = {}
-    for col_entry in jsn['data']:
-        col_name = col_entry['name']
-        cols[col_name] = col_entry['y']  # already a list
+    if isinstance(tc,dict):
+        parts = {**tc,'data':[(entry['name'],entry['y']) for entry in tc['data']
+            if columns is None or entry['name'] in columns]}
+    else:
+        try:
+            parts = _scanTC(tc,columns)
+        except ValueError:
+            # not laid out the way the scanner expects, parse the whole thing
+            jsn = _loadTC(tc)
+            parts = {**jsn,'data':[(entry['name'],entry['y']) for entry in jsn['data']
+                if columns is None or entry['name'] in columns]}
+    if columns is not None:
+        missing = set(columns) - {name for name,_ in parts['data']}
+        if missing:
+            raise KeyError(f'{missing} not in capsule traces')
 
+    # Each entry in 'data' has 'name' = column name, 'y' = column values
+    cols = {name:y for name,y in parts['data']}
     df = pd.DataFrame(cols)
-    if 'x' in jsn:
-        df.index = jsn['x']
-    df.index.name = jsn.get('layout', {}).get('xaxis', {}).get('title', {}).get('text', None)
+    if 'x' in parts:
+        df.index = _parseX(parts['x'],parseDates)
+    df.index.name = parts.get('layout', {}).get('xaxis', {}).get('title', {}).get('text', None)
+
+    if xrange is not None:
+        x0,x1 = xrange
+        keep = np.ones(len(df),dtype=bool)
+        if x0 is not None:
+            keep &= np.asarray(df.index >= x0)
+        if x1 is not None:
+            keep &= np.asarray(df.index <= x1)
+        df = df[keep]
 
-    df.attrs = jsn.get('attrz', {})
+    df.attrs = parts.get('attrz', {})
     
 
-    return df
\ No newline at end of file
+    return df
+def append(tc,newdf,attrz=None,data={},window=None):
+    '''append newdf's rows to the end of capsule tc, each column onto the trace of the same name
+    (traces newdf lacks get null)\n
+    attrz: new attrz dict, or func of the whole appended df (as in deposit) to recompute them\n
+    data: values or funcs of each whole appended column to recompute per trace, as in deposit\n
+    window: keep only the last window points (int), or those within window (Timedelta or str like '30D')
+    of the last x\n
+    without funcs or a window, a json capsule is extended as a byte stream: the new values are spliced
+    in before the end of x and each y, without parsing or re-serializing its history;
+    otherwise, and for binary or compact x capsules, it is read back and rewritten whole (x kept compact if it still is)'''
+    if isinstance(window,(int,np.integer)) and window < 1:
+        raise ValueError(f'window must keep at least 1 point, not {window}')
+    tc = Path(tc)
+    newdf = pd.DataFrame(newdf)
+    with _mapped(tc) as buf:
+        spans,traces,close = _capsuleSpans(buf)
+        if any(key in spans for key in ('xref','pyramid','downsample')):
+            raise ValueError(f"{tc} doesn't hold its full x, can't append to a shared x, pyramid or downsampled capsule")
+        names = [name for name,_ in traces]
+        extra = set(newdf.columns) - set(names)
+        if extra:
+            raise ValueError(f'{extra} not in capsule traces {names}')
+        splice = not (callable(attrz) or any(callable(val) for val in data.values()) or window is not None
+            or 'buffer' in spans or buf[spans['x'][0]:spans['x'][0]+1] != b'['
+            or None in (yspan for _,yspan in traces))
+        if splice:
+            edits = [_arrayEdit(buf,spans['x'],_formatX(newdf.index))]
+            for name,yspan in traces:
+                col = newdf[name] if name in newdf else pd.Series(np.nan,index=newdf.index)
+                arr = _numericArray(col)
+                edits += [_arrayEdit(buf,yspan,arr if arr is not None else nanmask2None(col))]
+            if attrz is not None:
+                body = json.dumps(nan2None(attrz),cls=_NullEncoder).encode()
+                edits += [(*spans['attrz'],body) if 'attrz' in spans else (close,close,b', "attrz": '+body)]
+            _spliceTC(tc,buf,sorted(edits,key=lambda edit:edit[0]))
+            return
+    _rewriteAppended(tc,newdf,attrz,data,window)
+
+def _rewriteAppended(tc,newdf,attrz=None,data={},window=None):
+    '''append() by reading tc whole and writing it back, with funcs recomputed and the window applied'''
+    jsn = _loads(_readBytes(tc))
+    compactX = _isCompactX(jsn.get('x'))
+    dtype = None
+    if 'buffer' in jsn:
+        dtype = next((np.dtype(trace['y']['dtype']).name for trace in jsn['data'] if isinstance(trace.get('y'),dict)),
+            'float64')
+        jsn = _loadTC(tc)
+    df = toDF(jsn)
+    df = pd.concat([df,newdf.reindex(columns=df.columns)])
+    if window is not None:
+        df = df.iloc[-window:] if isinstance(window,(int,np.integer)) \
+            else df[df.index > df.index[-1] - pd.Timedelta(window)]
+
+    attrz = jsn.get('attrz') if attrz is None else attrz
+    out = deposit(None,df,attrz=attrz,compactX=compactX)
+    out['data'] = [
+        {**trace,
+            'y':new['y'],
+            **{key:val if not callable(val) else val(df[trace['name']]) for key,val in data.items()}}
+        for trace,new in zip(jsn['data'],out['data']) ]
+    out['layout'] = jsn.get('layout',{})
+    out = {**{key:val for key,val in jsn.items() if key not in ('buffer','x','data','layout','attrz')},**out}
+    yarrays = [_numericArray(df[col]) for col in df.columns]
+    if dtype:
+        _writeBinaryTC(tc,out,df.index,yarrays,dtype=dtype)
+    else:
+        with _openOut(tc) as outfile:
+            outfile.write(_dumps(out,yarrays=yarrays))
+
+def _capsuleSpans(buf):
+    '''byte spans of a capsule json in buf: ({key:(start,end)} of its top level values,
+    [(name,(start,end) of y or None)] of its traces, offset of its closing brace)'''
+    i = _ws.match(buf,0).end()
+    spans,traces,last = {},[],None
+    for key,start,end in _items(buf,i):
+        spans[key] = (start,end)
+        last = end
+        if key == 'data':
+            for _,tstart,_ in _items(buf,start):
+                name,yspan = None,None
+                for tkey,ystart,yend in _items(buf,tstart):
+                    if tkey == 'name':
+                        name = json.loads(buf[ystart:yend])
+                    elif tkey == 'y':
+                        yspan = (ystart,yend)
+                traces += [(name,yspan)]
+    close = _sep.match(buf,last).start(1) if last is not None else buf.rfind(b'}')
+    return spans,traces,close
+
+def _arrayEdit(buf,span,values):
+    '''(start,end,bytes) edit inserting values at the end of the json array at span of buf'''
+    start,end = span
+    if buf[start:start+1] != b'[':
+        raise ValueError(f'expected a json array at {start}')
+    body = _jsonArrayBody(values)
+    if not body:
+        return (end-1,end-1,b'')
+    empty = _ws.match(buf,start+1).end() == end-1
+    return (end-1,end-1,(body if empty else ', '+body).encode())
+
+def _spliceTC(tc,buf,edits):
+    '''rewrite capsule file tc from its mmap buf, with each (start,end,bytes) of edits in place of buf[start:end]\n
+    the rest is copied across as is (recompressed if tc is compressed), to a temp file that then replaces tc'''
+    tmp = tc.with_name(f'.{tc.name}.tmp')
+    try:
+        with _openOut(tmp,'wb',codec=_codec(tc)) as out, memoryview(buf) as view:
+            pos = 0
+            for start,end,new in edits:
+                out.write(view[pos:start])
+                out.write(new)
+                pos = end
+            out.write(view[pos:])
+        os.replace(tmp,tc)
+    except BaseException:
+        tmp.unlink(missing_ok=True)
+        raise
+
+def concat(capsules,outJSON,axis='x',overlap='last',attrz=None,layout=None):
+    '''combine capsule files into outJSON without going through DataFrames:
+    their x axes are sorted-merged once, then each output trace is read from its inputs and written out in turn\n
+    axis 'x': stitch the capsules along x (eg consecutive periods of a record), traces matched up by name,
+    with null where a capsule lacks a trace or between them;
+    overlap: 'last' or 'first', whose rows are kept where capsules share an x\n
+    axis 'traces': every trace of every capsule side by side on the union of their x, same as merge\n
+    attrz, layout: for outJSON, by default the first capsule's\n
+    returns outJSON'''
+    assert axis in ('x','traces'), f"axis must be 'x' or 'traces', not {axis}"
+    assert overlap in ('last','first'), f"overlap must be 'last' or 'first', not {overlap}"
+    if axis == 'traces':
+        return merge(capsules,outJSON,attrz=attrz,layout=layout)
+    with ExitStack() as stack:
+        capsules = [_MappedCapsule(tc,stack) for tc in capsules]
+        xs = [tc.x() for tc in capsules]
+        target = reduce(np.union1d,xs)
+        traces = {}
+        for c,tc in enumerate(capsules):
+            for trace in tc.metas:
+                traces.setdefault(trace['name'],(trace,[]))[1].append(c)
+        order = (lambda sources: sources) if overlap == 'last' else (lambda sources: sources[::-1])
+        return _combine(capsules,outJSON,target,xs,
+            [(trace,order(sources)) for trace,sources in traces.values()],attrz,layout)
+
+def merge(capsules,outJSON,how='outer',attrz=None,layout=None):
+    '''put the traces of capsule files side by side in outJSON on a sorted merge of their x axes,
+    reading and writing 1 trace at a time (see concat)\n
+    how: 'outer' (every x, null where a capsule has no value), 'inner' (only x every capsule has)
+    or 'left' (the first capsule's x)\n
+    trace names must be unique across the capsules\n
+    returns outJSON'''
+    assert how in ('outer','inner','left'), f"how must be 'outer', 'inner' or 'left', not {how}"
+    with ExitStack() as stack:
+        capsules = [_MappedCapsule(tc,stack) for tc in capsules]
+        xs = [tc.x() for tc in capsules]
+        target = {'outer':lambda: reduce(np.union1d,xs),
+            'inner':lambda: reduce(np.intersect1d,xs),
+            'left':lambda: np.unique(xs[0])}[how]()
+        traces = [(trace,[c]) for c,tc in enumerate(capsules) for trace in tc.metas]
+        names = pd.Series([trace['name'] for trace,_ in traces])
+        if names.duplicated().any():
+            raise ValueError(f'trace names {set(names[names.duplicated()])} are in more than 1 capsule, use concat to stitch them')
+        return _combine(capsules,outJSON,target,xs,traces,attrz,layout)
+
+class _MappedCapsule:
+    '''capsule file tc mapped (inflated first if compressed) once for the life of stack, an ExitStack,
+    and scanned once for the spans of its top level values and traces, so concat/merge parse its x,
+    trace metadata and each y straight from the map instead of rescanning the file for every trace'''
+    def __init__(self,tc,stack):
+        self.tc = Path(tc)
+        self.buf = buf = stack.enter_context(_mapped(self.tc))
+        self.spans, self.metas, self.yspans = {}, [], {}
+        for key,start,end in _items(buf,_ws.match(buf,0).end()):
+            self.spans[key] = (start,end)
+            if key == 'data':
+                for _,tstart,_ in _items(buf,start):
+                    meta,yspan = {},None
+                    for tkey,vstart,vend in _items(buf,tstart):
+                        if tkey == 'y':
+                            yspan = (vstart,vend)
+                        else:
+                            meta[tkey] = _loads(buf[vstart:vend])
+                    self.metas += [meta]
+                    self.yspans.setdefault(meta.get('name'),yspan)
+    def value(self,key,default=None):
+        if key not in self.spans:
+            return default
+        start,end = self.spans[key]
+        return _loads(self.buf[start:end])
+    def _parts(self,**parts):
+        if 'buffer' in self.spans:
+            parts['buffer'] = self.value('buffer')
+        return _resolveParts(self.tc,parts)
+    def x(self):
+        '''x values as a np array (datetime64 for deposit's datetime strings)'''
+        parts = {'xref':self.value('xref')} if 'xref' in self.spans else {}
+        if 'x' in self.spans:
+            start,end = self.spans['x']
+            parts['x'] = _parseArray(self.buf[start:end])
+        return _parseX(self._parts(**parts)['x']).values
+    def y(self,name):
+        '''y of the first trace called name'''
+        span = self.yspans[name]
+        y = _parseArray(self.buf[span[0]:span[1]]) if span else []
+        return self._parts(data=[(name,y)])['data'][0][1]
+
+def _traceMeta(tc):
+    '''the traces of capsule file tc without their y, parsed from a mmap'''
+    with _mapped(tc) as buf:
+        spans,_,_ = _capsuleSpans(buf)
+        return [{key:_loads(buf[start:end]) for key,start,end in _items(buf,tstart) if key != 'y'}
+            for _,tstart,_ in _items(buf,spans['data'][0])]
+
+def _combine(capsules,outJSON,target,xs,traces,attrz=None,layout=None):
+    '''capsules: _MappedCapsules, write outJSON with x target (sorted unique values) and traces [(trace without y,[capsule numbers])],
+    each y filled from those capsules in order, later ones overwriting, wherever their x (xs) is in target'''
+    places = []
+    for x in xs:
+        pos = np.minimum(np.searchsorted(target,x),max(len(target)-1,0))
+        found = target[pos] == x if len(target) else np.zeros(len(x),dtype=bool)
+        places += [(pos[found],found)]
+    layout = capsules[0].value('layout',{}) if layout is None else layout
+    attrz = capsules[0].value('attrz') if attrz is None else attrz
+
+    def fill(name,sources):
+        ys = [(places[c],capsules[c].y(name)) for c in sources]
+        covered = np.zeros(len(target),dtype=bool)
+        if all(isinstance(y,np.ndarray) for _,y in ys):
+            dtype = np.result_type(*[y.dtype for _,y in ys]) if ys else np.float64
+            out = np.full(len(target),np.nan) if dtype.kind == 'f' else np.zeros(len(target),dtype=dtype)
+        else:
+            out = np.full(len(target),None,dtype=object)
+        for (pos,found),y in ys:
+            out[pos] = np.asarray(y,dtype=out.dtype if out.dtype == object else None)[found]
+            covered[pos] = True
+        if out.dtype.kind in 'iub' and not covered.all():
+            out = np.where(covered,out,np.nan)
+        return out if out.dtype != object else nan2None(out.tolist())
+
+    with _openOut(outJSON) as outfile:
+        outfile.write('{"x": ['+_jsonArrayBody(_formatX(pd.Index(target)))+'], "data": [')
+        for i,(trace,sources) in enumerate(traces):
+            head,tail = _traceParts(trace['name'],{key:val for key,val in trace.items() if key != 'name'})
+            outfile.write((', ' if i else '')+head+_jsonArrayBody(fill(trace['name'],sources))+tail)
+        outfile.write('], "layout": '+json.dumps(nan2None(layout),cls=_NullEncoder))
+        if attrz:
+            outfile.write(', "attrz": '+json.dumps(nan2None(attrz),cls=_NullEncoder))
+        outfile.write('}')
+    return outJSON
+
+# suite catalog: capsule metadata in 1 sqlite file, so it can be queried without opening any capsule
+_catalogSchema = '''CREATE TABLE IF NOT EXISTS capsules (path TEXT PRIMARY KEY, trial TEXT, stem TEXT, traces TEXT,
+    x0, x1, points INTEGER, bytes INTEGER, mtime_ns INTEGER);
+CREATE TABLE IF NOT EXISTS attrz (path TEXT REFERENCES capsules(path) ON DELETE CASCADE, key TEXT, value,
+    PRIMARY KEY (path,key));
+CREATE INDEX IF NOT EXISTS attrzKey ON attrz (key,value);'''
+
+def _openCatalog(suitepth):
+    db = sqlite3.connect(Path(suitepth)/'_catalog.sqlite')
+    db.execute('PRAGMA foreign_keys = ON')
+    db.executescript(_catalogSchema)
+    return db
+
+def _suiteCapsules(suitepth):
+    '''capsule files anywhere under suitepth, skipping _ prefixed sidecars (and sidecar dirs, eg pyramid tiles)'''
+    return [f for f in sorted(suitepth.rglob('*.json*')) if _isCapsule(f)
+        and not any(part.startswith(('_','.')) for part in f.relative_to(suitepth).parts)]
+
+def _catalogRow(suitepth,tc):
+    '''(capsules row, attrz rows) for capsule file tc'''
+    parts = _scanTC(tc,columns=[])
+    X = parts.get('x',[])
+    X = _expandX(X) if _isCompactX(X) else X
+    points = len(X)
+    X = _formatXuncached(X) if isinstance(X,pd.DatetimeIndex) else list(X)
+    X = [x.item() if isinstance(x,np.generic) else x for x in (X[:1]+X[-1:])]
+    rel = tc.relative_to(suitepth)
+    stat = tc.stat()
+    traces = [trace['name'] for trace in _traceMeta(tc)]
+    row = (rel.as_posix(),rel.parent.as_posix(),_capsuleStem(tc),json.dumps(traces),
+        X[0] if X else None,X[-1] if X else None,points,stat.st_size,stat.st_mtime_ns)
+    attrz = parts.get('attrz') or {}
+    attrz = attrz if isinstance(attrz,dict) else {}
+    return row, [(rel.as_posix(),key,val if isinstance(val,(int,float,str)) or val is None else json.dumps(val))
+        for key,val in nan2None(attrz).items()]
+
+def updateCatalog(suitepth,capsules=None):
+    '''index capsule files into suitepth/_catalog.sqlite: path (relative to suitepth), trial (its dir),
+    stem, trace names, first/last x, point count, file size and every attrz key/value\n
+    capsules: files under suitepth to (re)index, default every capsule there; files unchanged since they
+    were indexed (same size and mtime) are skipped, and entries whose file is gone are dropped'''
+    suitepth = Path(suitepth)
+    capsules = _suiteCapsules(suitepth) if capsules is None else [Path(tc) for tc in capsules]
+    with closing(_openCatalog(suitepth)) as db, db:
+        known = {path:(size,mtime) for path,size,mtime in db.execute('SELECT path,bytes,mtime_ns FROM capsules')}
+        gone = [(path,) for path in known if not (suitepth/path).exists()]
+        db.executemany('DELETE FROM capsules WHERE path = ?',gone)
+        for tc in capsules:
+            stat = tc.stat()
+            if known.get(tc.relative_to(suitepth).as_posix()) == (stat.st_size,stat.st_mtime_ns):
+                continue
+            row,attrz = _catalogRow(suitepth,tc)
+            db.execute('DELETE FROM capsules WHERE path = ?',row[:1])
+            db.execute('INSERT INTO capsules VALUES (?,?,?,?,?,?,?,?,?)',row)
+            db.executemany('INSERT INTO attrz VALUES (?,?,?)',attrz)
+    return suitepth/'_catalog.sqlite'
+
+def queryCatalog(suitepth,where=None,params=(),orderby=None) -> pd.DataFrame:
+    '''query the suitepth/_catalog.sqlite written by updateCatalog, without opening any capsule\n
+    returns a DataFrame of capsule metadata (path, trial, stem, traces, x0, x1, points, bytes) plus a column
+    per attrz key (named attrz.key instead if it clashes with one of those)\n
+    where, orderby: sql over those columns, with params for the ? in where,
+    eg queryCatalog(suite,'trial = ? AND NSE < ?',('plan1',0.5),orderby='NSE')'''
+    catalogpth = Path(suitepth)/'_catalog.sqlite'
+    if not catalogpth.exists():
+        raise FileNotFoundError(f'no catalog at {catalogpth}, see updateCatalog')
+    quote = lambda name: '"'+name.replace('"','""')+'"'
+    with closing(_openCatalog(suitepth)) as db:
+        base = [row[1].lower() for row in db.execute('PRAGMA table_info(capsules)')]
+        keys = [key for key, in db.execute('SELECT DISTINCT key FROM attrz ORDER BY key')]
+        pivot = ''.join(', MAX(CASE WHEN a.key = ? THEN a.value END) AS '+quote(f'attrz.{key}' if key.lower() in base else key)
+            for key in keys)
+        sql = f'SELECT * FROM (SELECT c.*{pivot} FROM capsules c LEFT JOIN attrz a ON a.path = c.path GROUP BY c.path)'
+        if where:
+            sql += f' WHERE {where}'
+        sql += f' ORDER BY {orderby}' if orderby else ' ORDER BY path'
+        df = pd.read_sql_query(sql,db,params=(*keys,*params))
+    df['traces'] = df['traces'].map(json.loads)
+    return df.drop(columns='mtime_ns')
+
+import asyncio
+from http import HTTPStatus
+from urllib.parse import urlsplit, parse_qs, unquote
+
+class CapsuleServer:
+    '''serves the capsules of a suite dir over http, sliced and decimated server side\n
+    GET /<trial>/<capsule>?traces=Sim,Obs&x0=...&x1=...&maxpoints=2000&method=lttb
+    answers with a compact capsule json (see deposit's compactX) of just those traces, x0 <= x <= x1,
+    downsampled to maxpoints (pyramid capsules are read from their tiles, see zoomDF);
+    <capsule> is its file name or stem, with or without the ts_ prefix\n
+    GET /<trial> (or /) lists the capsules under it\n
+    parsed capsules are kept in an LRU of at most cachebytes of DataFrames, and encoded responses in one of
+    responsebytes; both are keyed by the capsule's size and mtime, so rewritten capsules are reread.
+    Responses carry an ETag (304 for a matching If-None-Match) and are gzipped for clients that accept it'''
+    def __init__(self,suitepth,cachebytes=256*2**20,responsebytes=64*2**20):
+        self.suitepth = Path(suitepth)
+        self.capsules = _LRU(maxsize=cachebytes,sizeof=lambda entry: entry[0])
+        self.responses = _LRU(maxsize=responsebytes,sizeof=len)
+
+    def _resolve(self,relpath):
+        '''capsule file for the request path relpath, None if there isn't one in the suite'''
+        pth = self.suitepth/relpath
+        names = [pth.name] if _isCapsule(pth) else [stem+ext for stem in (pth.name,f'ts_{pth.name}')
+            for ext in ('.json',*(f'.json{suffix}' for suffix in _codecs))]
+        for name in names:
+            tc = pth.with_name(name)
+            try:
+                tc.resolve().relative_to(self.suitepth.resolve())
+            except ValueError:
+                return None
+            if tc.is_file() and not any(part.startswith(('_','.')) for part in tc.relative_to(self.suitepth).parts):
+                return tc
+        return None
+
+    def _load(self,tc,stat):
+        '''(df of every trace, head {'layout','pyramid'}, {trace name: its data extras}) of capsule tc, cached'''
+        key = (str(tc),stat.st_size,stat.st_mtime_ns)
+        entry = self.capsules.get(key)
+        if entry is None:
+            head = _scanTC(tc,columns=[])
+            df = None if head.get('pyramid') else toDF(tc)
+            metas = {trace['name']:{k:v for k,v in trace.items() if k != 'name'} for trace in _traceMeta(tc)}
+            nbytes = int(df.memory_usage(deep=True).sum()) if df is not None else 0
+            entry = (nbytes,df,head,metas)
+            self.capsules[key] = entry
+        return entry[1:]
+
+    def _capsule(self,tc,stat,params):
+        '''encoded capsule json answering params for capsule tc'''
+        df,head,metas = self._load(tc,stat)
+        traces = params['traces'][0].split(',') if params.get('traces') else None
+        maxpoints = int(params['maxpoints'][0]) if params.get('maxpoints') else None
+        if maxpoints is not None and maxpoints < 1:
+            raise ValueError(f'maxpoints must be at least 1, not {maxpoints}')
+        # x0/x1 parsed as the capsule's x, so a bad one is the client's error rather than a failed comparison
+        dates = is_datetime(df.index) if df is not None else is_datetime(_parseX(head['x']))
+        x0,x1 = (_parseBound(params[key][0],dates,key) if params.get(key) else None for key in ('x0','x1'))
+        method = params.get('method',['lttb'])[0]
+        if method not in ('lttb','minmax'):
+            raise ValueError(f"method must be 'lttb' or 'minmax', not {method}")
+        if traces is not None and set(traces) - set(metas):
+            raise ValueError(f'{set(traces)-set(metas)} not in capsule traces {list(metas)}')
+        if df is None:
+            df = zoomDF(tc,(x0,x1),maxpoints,traces)
+        else:
+            if traces is not None:
+                df = df[traces]
+            keep = np.ones(len(df),dtype=bool)
+            if x0 is not None:
+                keep &= np.asarray(df.index >= x0)
+            if x1 is not None:
+                keep &= np.asarray(df.index <= x1)
+            df = df[keep]
+        jsn = deposit(None,df,attrz=df.attrs or None,layout=head.get('layout',{}),
+            downsample=maxpoints,downsampler=method,compactX=True)
+        jsn['data'] = [{'name':trace['name'],**metas.get(trace['name'],{}),'y':trace['y']} for trace in jsn['data']]
+        return _dumps(jsn).encode()
+
+    def query(self,target,headers={}):
+        '''(status, headers, body) for a GET of target (path?query) with the lowercased request headers'''
+        url = urlsplit(target)
+        relpath = unquote(url.path).strip('/')
+        params = parse_qs(url.query)
+        try:
+            if relpath.startswith(('_','.')) or '..' in Path(relpath).parts:
+                return _response(404,{'error':f'{relpath} not found'})
+            if relpath == '' or (self.suitepth/relpath).is_dir():
+                capsules = [f for f in _suiteCapsules(self.suitepth)
+                    if relpath == '' or f.parent.relative_to(self.suitepth).as_posix() == relpath]
+                return _response(200,[(f.parent/_capsuleStem(f)).relative_to(self.suitepth).as_posix() for f in capsules])
+            tc = self._resolve(relpath)
+            if tc is None:
+                return _response(404,{'error':f'no capsule {relpath}'})
+            stat = tc.stat()
+            gz = 'gzip' in headers.get('accept-encoding','')
+            tag = hashlib.blake2b(json.dumps([relpath,stat.st_size,stat.st_mtime_ns,sorted(params.items())]).encode(),
+                digest_size=12).hexdigest()
+            etag = f'"{tag}-gz"' if gz else f'"{tag}"'
+            if etag in (match.strip() for match in headers.get('if-none-match','').split(',')):
+                return 304,{'ETag':etag,'Vary':'Accept-Encoding'},b''
+            body = self.responses.get(etag)
+            if body is None:
+                body = self._capsule(tc,stat,params)
+                body = gzip.compress(body,mtime=0) if gz else body
+                self.responses[etag] = body
+        except ValueError as err:
+            return _response(400,{'error':str(err)})
+        return 200,{'Content-Type':'application/json','ETag':etag,'Vary':'Accept-Encoding',
+            **({'Content-Encoding':'gzip'} if gz else {})},body
+
+    async def _handle(self,reader,writer):
+        '''answer the http/1.1 requests on 1 connection, keeping it alive unless asked not to'''
+        loop = asyncio.get_running_loop()
+        try:
+            while True:
+                line = await reader.readline()
+                if not line.strip():
+                    break
+                method,target,version = line.decode('latin-1').split()
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if not line.strip():
+                        break
+                    key,_,val = line.decode('latin-1').partition(':')
+                    headers[key.strip().lower()] = val.strip()
+                if method in ('GET','HEAD'):
+                    try:
+                        # parsing capsules is left to a thread, so it doesn't hold up other connections
+                        status,hdrs,body = await loop.run_in_executor(None,self.query,target,headers)
+                    except Exception:
+                        logger.exception('Failed to answer %s',target)
+                        status,hdrs,body = _response(500,{'error':'internal error'})
+                else:
+                    status,hdrs,body = _response(405,{'error':f'{method} not allowed'})
+                close = headers.get('connection','').lower() == 'close' or version == 'HTTP/1.0'
+                hdrs = {**hdrs,'Content-Length':str(len(body)),'Cache-Control':'no-cache',
+                    'Access-Control-Allow-Origin':'*','Connection':'close' if close else 'keep-alive'}
+                writer.write((f'HTTP/1.1 {status} {HTTPStatus(status).phrase}\r\n'
+                    +''.join(f'{key}: {val}\r\n' for key,val in hdrs.items())+'\r\n').encode('latin-1'))
+                if method != 'HEAD':
+                    writer.write(body)
+                await writer.drain()
+                if close:
+                    break
+        except (ConnectionError,ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def start(self,host='127.0.0.1',port=8000):
+        '''start listening on host:port (0 for any free port), returns the asyncio.Server'''
+        return await asyncio.start_server(self._handle,host,port)
+
+def _parseBound(x,dates,name='x0'):
+    '''x0/x1 query value x as a Timestamp for a datetime x axis (dates), else a float; ValueError if it isn't one'''
+    try:
+        return pd.Timestamp(x) if dates else float(x)
+    except (TypeError,ValueError):
+        raise ValueError(f"{name} {x!r} isn't a {'datetime' if dates else 'number'}") from None
+
+def _response(status,obj):
+    '''(status, headers, body) of a json response'''
+    return status,{'Content-Type':'application/json'},json.dumps(obj).encode()
+
+def serveSuite(suitepth,host='127.0.0.1',port=8000,**kw):
+    '''serve suitepth's capsules until interrupted, see CapsuleServer (kw) for the queries it answers'''
+    server = CapsuleServer(suitepth,**kw)
+    async def main():
+        srv = await server.start(host,port)
+        logger.info('Serving %s at http://%s:%s/',suitepth,host,port)
+        async with srv:
+            await srv.serve_forever()
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass